@@ -1,5 +1,5 @@
-from flask import Flask, jsonify
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
+from flask import Flask, jsonify, request
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, verify_jwt_in_request
 from flask_cors import CORS
 from flask_mail import Mail
 from config import config
@@ -12,6 +12,8 @@ from routes.support import support_bp
 from routes.users import users_bp
 from routes.db_api import db_bp
 from routes.customers_api import customers_bp
+from routes.dlr import dlr_bp
+from utils.replicas import mark_write
 import os
 import logging
 
@@ -52,6 +54,21 @@ app.register_blueprint(support_bp, url_prefix="/api/support")
 app.register_blueprint(users_bp, url_prefix="/api/users")
 app.register_blueprint(db_bp,url_prefix="/api/databases")
 app.register_blueprint(customers_bp,url_prefix="/api/customers")
+app.register_blueprint(dlr_bp, url_prefix="/api/dlr")
+
+
+# --- Read-your-writes: a user's successful mutations pin their replica reads to the primary ---
+@app.after_request
+def pin_reads_after_write(response):
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+        except Exception:
+            user_id = None
+        if user_id:
+            mark_write(user_id)
+    return response
 
 
 # ✅ --- Token verification route ---
@@ -0,0 +1,201 @@
+# backend/benchmarks/send_pipeline.py
+"""
+Throughput benchmark for the SMS send path against mock_provider.py.
+
+Needs MySQL, Redis and a dedicated benchmark tenant whose sms_api_url points
+at the mock provider (run everything with SMS_TEST_MODE=true):
+
+    python mock_provider.py --latency-ms 80 &
+    python -m benchmarks.send_pipeline --user-id 42 --seed 5000 --mode runner
+    python -m benchmarks.send_pipeline --user-id 42 --seed 5000 --mode celery   # needs a worker
+
+Provider pacing still applies: raise SMS_PROVIDER_RATE_LIMITS for 127.0.0.1
+(or disable SMS_RATE_LIMIT_ENABLED) to measure the pipeline rather than the limiter.
+
+--seed replaces the tenant's benchmark recipients (phones starting with
+BENCH_PREFIX) and their sent_messages rows, so never use it on a real tenant.
+
+Reports messages/s, p50/p99 provider dispatch latency (runner mode only; the
+Celery worker runs in another process) and statement counters from SHOW
+GLOBAL STATUS on the tenant server per message. The counters are server-wide,
+so run it on an otherwise idle database.
+"""
+import argparse
+import json
+import time
+
+import requests
+
+from config import config
+from db import get_main_connection, get_user_connection
+from routes import sms
+from utils.campaigns import count_recipients, create_campaign, get_campaign, stop_running_campaigns
+from utils.progress import get_progress, start_progress
+
+BENCH_PREFIX = "2009990"
+WRITE_COUNTERS = ("Com_insert", "Com_update", "Com_delete", "Com_replace", "Com_commit")
+
+
+def seed(user_id, n):
+    conn = get_user_connection(user_id)
+    try:
+        cur = conn.cursor()
+        stop_running_campaigns(conn)
+        cur.execute("DELETE FROM sent_messages WHERE phone LIKE %s", (BENCH_PREFIX + "%",))
+        cur.execute("DELETE FROM customers WHERE phone LIKE %s", (BENCH_PREFIX + "%",))
+        rows = [(f"{BENCH_PREFIX}{i:06d}", f"Bench {i}") for i in range(n)]
+        for i in range(0, len(rows), 1000):
+            cur.executemany("INSERT INTO customers (phone, name) VALUES (%s, %s)", rows[i:i + 1000])
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def write_counters(user_id):
+    conn = get_user_connection(user_id)
+    try:
+        cur = conn.cursor()
+        placeholders = ",".join(["%s"] * len(WRITE_COUNTERS))
+        cur.execute(f"SHOW GLOBAL STATUS WHERE Variable_name IN ({placeholders})", WRITE_COUNTERS)
+        counters = {name: int(value) for name, value in cur.fetchall()}
+        cur.close()
+        return counters
+    finally:
+        conn.close()
+
+
+def set_sending(user_id, enabled):
+    conn = get_main_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE users SET sms_sending = %s WHERE id = %s", (enabled, user_id))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def timed_retry_post(latencies):
+    """Wrap routes.sms.retry_post to record the duration of every provider request."""
+    original = sms.retry_post
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    sms.retry_post = wrapper
+    return original
+
+
+def run_runner(user_id, message, timeout):
+    """Call send_user_sms_batch_runner in this process until the campaign ends."""
+    campaign_id = None
+    sent = failed = 0
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = sms.send_user_sms_batch_runner(user_id, message, campaign_id)
+        campaign_id = result.get("campaign_id", campaign_id)
+        sent += result.get("sent", 0)
+        failed += result.get("failed", 0)
+        if result["status"] == "deferred":
+            time.sleep(result["retry_in"])
+        elif result["status"] != "ok":
+            return result["status"], sent, failed
+    return "timeout", sent, failed
+
+
+def run_celery(user_id, message, timeout):
+    """Start the campaign like POST /api/sms/send and wait for the workers to finish it."""
+    conn = get_user_connection(user_id)
+    try:
+        stop_running_campaigns(conn)
+        campaign_id = create_campaign(conn, message)
+        start_progress(user_id, campaign_id, count_recipients(conn))
+    finally:
+        conn.close()
+    sms.start_sender(user_id, message, campaign_id)
+
+    deadline = time.monotonic() + timeout
+    status = "timeout"
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        conn = get_user_connection(user_id)
+        try:
+            campaign = get_campaign(conn, campaign_id)
+        finally:
+            conn.close()
+        if campaign["status"] != "running":
+            status = campaign["status"]
+            break
+    progress = get_progress(user_id, campaign_id)
+    return status, progress["sent"], progress["failed"]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SMS send pipeline against the mock provider")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--mode", choices=("runner", "celery"), default="runner")
+    parser.add_argument("--seed", type=int, default=0, help="replace the benchmark recipients with N new ones")
+    parser.add_argument("--message", default="Hello {name}, this is a benchmark message.")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:5055")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    if not config.SMS_TEST_MODE:
+        parser.error("set SMS_TEST_MODE=true so the mock provider URL is allowed")
+    if args.seed:
+        seed(args.user_id, args.seed)
+    requests.delete(args.mock_url + "/_mock/stats", timeout=5)
+    set_sending(args.user_id, True)
+
+    latencies = []
+    original = timed_retry_post(latencies) if args.mode == "runner" else None
+    before = write_counters(args.user_id)
+    started = time.perf_counter()
+    try:
+        if args.mode == "runner":
+            status, sent, failed = run_runner(args.user_id, args.message, args.timeout)
+        else:
+            status, sent, failed = run_celery(args.user_id, args.message, args.timeout)
+    finally:
+        if original:
+            sms.retry_post = original
+    elapsed = time.perf_counter() - started
+    after = write_counters(args.user_id)
+
+    messages = sent + failed
+    deltas = {name: after.get(name, 0) - before.get(name, 0) for name in WRITE_COUNTERS}
+    writes = sum(v for name, v in deltas.items() if name != "Com_commit")
+    p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+    report = {
+        "mode": args.mode,
+        "status": status,
+        "messages": messages,
+        "sent": sent,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "msgs_per_second": round(messages / elapsed, 2) if elapsed else None,
+        "provider_requests": len(latencies) if args.mode == "runner" else None,
+        "dispatch_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+        "dispatch_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+        "db_writes_per_message": round(writes / messages, 3) if messages else None,
+        "db_commits_per_message": round(deltas["Com_commit"] / messages, 3) if messages else None,
+        "db_counters": deltas,
+        "provider": requests.get(args.mock_url + "/_mock/stats", timeout=5).json(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
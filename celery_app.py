@@ -6,7 +6,7 @@ celery_app = Celery(
     "sms_system",
     broker=config.CELERY_BROKER_URL,
     backend=config.CELERY_RESULT_BACKEND,
-    include=["routes.sms"],  # ensure tasks defined in routes.sms are discovered
+    include=["routes.sms", "routes.dlr", "routes.upload", "utils.outbox", "utils.provisioning"],  # ensure tasks defined in routes are discovered
 )
 
 celery_app.conf.update(
@@ -16,8 +16,21 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     broker_connection_retry_on_startup=True,
-    worker_pool='solo',
-    
+    # Pool per deployment: solo (default), prefork, threads or gevent
+    worker_pool=config.CELERY_WORKER_POOL,
+    worker_concurrency=config.CELERY_WORKER_CONCURRENCY,
+    # Take one task at a time so queued tenants are not hoarded by a busy worker
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    # Default is 1h: a longer import (or a task waiting out its countdown) would be delivered twice
+    broker_transport_options={"visibility_timeout": config.CELERY_VISIBILITY_TIMEOUT_SECONDS},
+    # First match wins: transactional sends get their own queue (and worker) ahead of the bulk lane;
+    # long contact imports get theirs so they never hold up campaign, DLR or outbox tasks
+    task_routes={
+        "sms.send_priority": {"queue": config.SMS_PRIORITY_QUEUE},
+        "sms.*": {"queue": "sms_bulk"},
+        "imports.*": {"queue": config.IMPORT_QUEUE},
+    },
 )
 
 
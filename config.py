@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +12,42 @@ class Config:
     MAIN_DB_USER = os.getenv("MAIN_DB_USER", "root")
     MAIN_DB_PASSWORD = os.getenv("MAIN_DB_PASSWORD", "wangkor")
     MAIN_DB_NAME = os.getenv("MAIN_DB_NAME", "sya_main")
+    # Tenant DB settings are cached per process; invalidate_tenant bumps a Redis version every process checks
+    TENANT_INFO_CACHE_SECONDS = int(os.getenv("TENANT_INFO_CACHE_SECONDS", 300))
+    # Tenant pools (utils/pool_manager.py): connections per tenant, total across tenants,
+    # idle connections closed after TENANT_POOL_IDLE_SECONDS, checkout wait before PoolError
+    TENANT_POOL_SIZE = int(os.getenv("TENANT_POOL_SIZE", 5))
+    TENANT_POOL_MAX_CONNECTIONS = int(os.getenv("TENANT_POOL_MAX_CONNECTIONS", 100))
+    TENANT_POOL_IDLE_SECONDS = int(os.getenv("TENANT_POOL_IDLE_SECONDS", 300))
+    TENANT_POOL_CHECKOUT_TIMEOUT = float(os.getenv("TENANT_POOL_CHECKOUT_TIMEOUT", 10))
+    # get_db_connection pools (main-server credentials, one pool per database name)
+    SERVER_POOL_SIZE = int(os.getenv("SERVER_POOL_SIZE", 5))
+    SERVER_POOL_MAX_CONNECTIONS = int(os.getenv("SERVER_POOL_MAX_CONNECTIONS", 20))
+    # Pooled connections idle longer than this are pinged (and reconnected) on checkout
+    DB_POOL_PING_SECONDS = int(os.getenv("DB_POOL_PING_SECONDS", 30))
+    # Spare tenant databases kept ready for registration (utils/provisioning.py)
+    TENANT_SPARE_POOL_SIZE = int(os.getenv("TENANT_SPARE_POOL_SIZE", 3))
+    TENANT_SPARE_LOCK_SECONDS = int(os.getenv("TENANT_SPARE_LOCK_SECONDS", 600))
+    # Tenant schema migrations (python -m utils.migrations)
+    MIGRATION_CONCURRENCY = int(os.getenv("MIGRATION_CONCURRENCY", 8))
+    MIGRATION_LOCK_WAIT_SECONDS = int(os.getenv("MIGRATION_LOCK_WAIT_SECONDS", 5))
+    # Read replicas: main DB replicas, tenant replicas per tenant primary host
+    # (e.g. {"db1.internal": ["db1-replica.internal"]}); reads fall back to the primary
+    MAIN_DB_REPLICA_HOSTS = [h for h in os.getenv("MAIN_DB_REPLICA_HOSTS", "").split(",") if h]
+    TENANT_DB_REPLICA_HOSTS = json.loads(os.getenv("TENANT_DB_REPLICA_HOSTS", "{}"))
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", 5))
+    # Account that reads replication lag on every replica host (main and tenant); needs REPLICATION CLIENT
+    REPLICA_MONITOR_USER = os.getenv("REPLICA_MONITOR_USER", MAIN_DB_USER)
+    REPLICA_MONITOR_PASSWORD = os.getenv("REPLICA_MONITOR_PASSWORD", MAIN_DB_PASSWORD)
+    READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+    REPLICA_POOL_SIZE = int(os.getenv("REPLICA_POOL_SIZE", 5))
+    REPLICA_POOL_MAX_CONNECTIONS = int(os.getenv("REPLICA_POOL_MAX_CONNECTIONS", 50))
+    # Statement instrumentation (utils/db_metrics.py)
+    DB_METRICS_ENABLED = os.getenv("DB_METRICS_ENABLED", "True").lower() == "true"
+    DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+    DB_METRICS_FLUSH_SECONDS = float(os.getenv("DB_METRICS_FLUSH_SECONDS", 10))
+    DB_METRICS_MAX_STATEMENTS = int(os.getenv("DB_METRICS_MAX_STATEMENTS", 500))
 
     # ---------- JWT ----------
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwt")
@@ -19,15 +56,104 @@ class Config:
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     CELERY_BROKER_URL = REDIS_URL
     CELERY_RESULT_BACKEND = REDIS_URL
+    CELERY_WORKER_POOL = os.getenv("CELERY_WORKER_POOL", "solo")
+    CELERY_WORKER_CONCURRENCY = int(os.getenv("CELERY_WORKER_CONCURRENCY", 1))
+    # With acks_late the Redis broker redelivers a task that is not acked within this window,
+    # counted from delivery: it must exceed the longest task plus its countdown/ETA (a contact
+    # import of the largest file, a sender slice, error backoffs of up to 600s)
+    CELERY_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("CELERY_VISIBILITY_TIMEOUT_SECONDS", 6 * 3600))
 
     # ---------- SMS ----------
     DEFAULT_SMS_MESSAGE = os.getenv("DEFAULT_SMS_MESSAGE", "Hello from SYA Group!")
     SMS_BATCH_SIZE = int(os.getenv("SMS_BATCH_SIZE", 10))
     SEND_DELAY_SECONDS = int(os.getenv("SEND_DELAY_SECONDS", 2))
+    # Provider requests kept in flight per tenant batch (1 = serial sending)
+    SMS_SEND_CONCURRENCY = int(os.getenv("SMS_SEND_CONCURRENCY", 1))
+    # Send outcomes are buffered and upserted into sent_messages in bulk
+    SMS_RESULT_FLUSH_ROWS = int(os.getenv("SMS_RESULT_FLUSH_ROWS", 500))
+    SMS_RESULT_FLUSH_SECONDS = float(os.getenv("SMS_RESULT_FLUSH_SECONDS", 2))
+    # Provider circuit breaker (shared in Redis) and the longest in-task retry wait
+    SMS_BREAKER_FAILURE_THRESHOLD = int(os.getenv("SMS_BREAKER_FAILURE_THRESHOLD", 5))
+    SMS_BREAKER_COOLDOWN_SECONDS = float(os.getenv("SMS_BREAKER_COOLDOWN_SECONDS", 30))
+    SMS_BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv("SMS_BREAKER_MAX_COOLDOWN_SECONDS", 600))
+    SMS_RETRY_MAX_WAIT_SECONDS = float(os.getenv("SMS_RETRY_MAX_WAIT_SECONDS", 10))
+    # "batch": one Celery task per batch (self-rescheduling); "loop": one task owns a campaign
+    SMS_SENDER_MODE = os.getenv("SMS_SENDER_MODE", "batch").lower()
+    # Batch mode: a batch that ended in an error is retried after base * 2^n seconds, up to the max
+    SMS_ERROR_BACKOFF_SECONDS = float(os.getenv("SMS_ERROR_BACKOFF_SECONDS", 5))
+    SMS_ERROR_MAX_BACKOFF_SECONDS = float(os.getenv("SMS_ERROR_MAX_BACKOFF_SECONDS", 600))
+    # Loop mode hands the campaign back to the queue after this long (checkpointed)
+    SMS_SENDER_SLICE_SECONDS = int(os.getenv("SMS_SENDER_SLICE_SECONDS", 300))
+    # How often a running sender re-reads sms_sending / quota / provider settings
+    SMS_CONTROL_REFRESH_SECONDS = float(os.getenv("SMS_CONTROL_REFRESH_SECONDS", 5))
+    # Fair-share scheduling of sender tasks across tenants (see utils/scheduler.py)
+    SMS_FAIR_SCHEDULING = os.getenv("SMS_FAIR_SCHEDULING", "True").lower() in ("true", "1", "t")
+    # Sender tasks leased at once across the whole deployment: set it to the total concurrency
+    # of all bulk workers (processes x CELERY_WORKER_CONCURRENCY)
+    SMS_SCHEDULER_MAX_SLOTS = int(os.getenv("SMS_SCHEDULER_MAX_SLOTS", 16))
+    SMS_TENANT_MAX_SLOTS = int(os.getenv("SMS_TENANT_MAX_SLOTS", 1))
+    SMS_TENANT_SLOTS = json.loads(os.getenv("SMS_TENANT_SLOTS", "{}"))   # {"<user_id>": slots}
+    SMS_SCHEDULER_LEASE_SECONDS = int(os.getenv("SMS_SCHEDULER_LEASE_SECONDS", 600))
+    SMS_SCHEDULER_TICK_SECONDS = int(os.getenv("SMS_SCHEDULER_TICK_SECONDS", 5))
+    # Quota ledger (utils/quota.py): reservation lifetime and users.sms_used write-back interval
+    SMS_QUOTA_RESERVATION_SECONDS = int(os.getenv("SMS_QUOTA_RESERVATION_SECONDS", 900))
+    SMS_QUOTA_SYNC_SECONDS = int(os.getenv("SMS_QUOTA_SYNC_SECONDS", 10))
+    # Charge quota per SMS segment (GSM-7 160/153, UCS-2 70/67) instead of per message
+    SMS_QUOTA_COUNT_SEGMENTS = os.getenv("SMS_QUOTA_COUNT_SEGMENTS", "False").lower() in ("true", "1", "t")
+    # /api/sms/progress/stream push interval and lifetime of one SSE connection. A stream holds a
+    # web worker while it is open: keep the lifetime well below gunicorn's --timeout (30s by default)
+    SMS_PROGRESS_STREAM_INTERVAL = float(os.getenv("SMS_PROGRESS_STREAM_INTERVAL", 1))
+    SMS_PROGRESS_STREAM_SECONDS = int(os.getenv("SMS_PROGRESS_STREAM_SECONDS", 10))
+    SMS_PROGRESS_STREAM_RETRY_MS = int(os.getenv("SMS_PROGRESS_STREAM_RETRY_MS", 2000))   # EventSource reconnect delay
+
+    # ---------- SMS Rate Limiting (Redis token buckets, shared by all workers) ----------
+    # When disabled, sends are paced by the fixed SEND_DELAY_SECONDS sleep
+    SMS_RATE_LIMIT_ENABLED = os.getenv("SMS_RATE_LIMIT_ENABLED", "True").lower() in ("true", "1", "t")
+    SMS_PROVIDER_DEFAULT_RATE = float(os.getenv("SMS_PROVIDER_DEFAULT_RATE", 5))    # msgs/s per provider host
+    SMS_PROVIDER_DEFAULT_BURST = float(os.getenv("SMS_PROVIDER_DEFAULT_BURST", 10))
+    # Per-host overrides, e.g. {"api.infobip.com": {"rate": 50, "burst": 100}}
+    SMS_PROVIDER_RATE_LIMITS = json.loads(os.getenv("SMS_PROVIDER_RATE_LIMITS", "{}"))
+    # Per-host override of recipients packed into one bulk request, e.g. {"api.infobip.com": 200}
+    SMS_PROVIDER_MAX_RECIPIENTS = json.loads(os.getenv("SMS_PROVIDER_MAX_RECIPIENTS", "{}"))
+
+    # Priority lane (POST /api/sms/priority): own Celery queue and a reserved share of every rate limit
+    SMS_PRIORITY_QUEUE = os.getenv("SMS_PRIORITY_QUEUE", "sms_priority")
+    SMS_PRIORITY_RESERVED_SHARE = float(os.getenv("SMS_PRIORITY_RESERVED_SHARE", 0.2))
+    SMS_PRIORITY_MAX_MESSAGES = int(os.getenv("SMS_PRIORITY_MAX_MESSAGES", 10))
+    SMS_PRIORITY_WAIT_SECONDS = float(os.getenv("SMS_PRIORITY_WAIT_SECONDS", 5))
+
+    # Adapter per provider host (a key of utils.providers.PROVIDERS), e.g. {"127.0.0.1": "api.infobip.com"}
+    SMS_PROVIDER_ADAPTERS = json.loads(os.getenv("SMS_PROVIDER_ADAPTERS", "{}"))
+    # Test mode lets sms_api_url point at the local mock provider (mock_provider.py)
+    SMS_TEST_MODE = os.getenv("SMS_TEST_MODE", "False").lower() == "true"
+    SMS_TEST_PROVIDER_HOSTS = set(os.getenv("SMS_TEST_PROVIDER_HOSTS", "127.0.0.1,localhost").split(","))
+
+    # ---------- Send Outcome Outbox (utils/outbox.py) ----------
+    # "db" writes sent_messages from the sender; "outbox" queues outcomes in a Redis stream for outbox.flush
+    SMS_RESULT_SINK = os.getenv("SMS_RESULT_SINK", "db")
+    OUTBOX_FLUSH_DELAY_SECONDS = int(os.getenv("OUTBOX_FLUSH_DELAY_SECONDS", 1))
+    OUTBOX_FLUSH_BATCH = int(os.getenv("OUTBOX_FLUSH_BATCH", 200))            # stream entries per read
+    OUTBOX_CLAIM_IDLE_SECONDS = int(os.getenv("OUTBOX_CLAIM_IDLE_SECONDS", 30))
+
+    # ---------- Delivery Reports (routes/dlr.py) ----------
+    DLR_FLUSH_DELAY_SECONDS = int(os.getenv("DLR_FLUSH_DELAY_SECONDS", 2))   # coalescing window
+    DLR_FLUSH_BATCH = int(os.getenv("DLR_FLUSH_BATCH", 5000))
+    DLR_FLUSH_LOCK_SECONDS = int(os.getenv("DLR_FLUSH_LOCK_SECONDS", 120))
+    # Failed applies per report before it is moved to the dlr:dead list (retries are ~30s apart)
+    DLR_MAX_ATTEMPTS = int(os.getenv("DLR_MAX_ATTEMPTS", 20))
 
     # ---------- File Upload ----------
+    # Contact uploads are spooled here and read by the import worker: when the web app and the
+    # workers run on different hosts/containers this must be storage they share (NFS, shared volume)
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(BASE_DIR, "uploads"))
     ALLOWED_EXTENSIONS = {"csv", "xlsx"}
+    # Contact import (utils/importer.py): rows per read/write chunk, LOAD DATA LOCAL INFILE when allowed
+    IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", 5000))
+    IMPORT_USE_LOAD_DATA = os.getenv("IMPORT_USE_LOAD_DATA", "False").lower() == "true"
+    # Celery queue of the background import jobs (routes/upload.py); needs its own worker
+    IMPORT_QUEUE = os.getenv("IMPORT_QUEUE", "imports")
+    # Country (utils/phone.NUMBERING_PLANS) assumed for phone numbers written without a calling code
+    PHONE_DEFAULT_COUNTRY = os.getenv("PHONE_DEFAULT_COUNTRY", "EG")
 
     # ---------- Email (for Forgot Password) ----------
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
@@ -1,6 +1,16 @@
-import mysql.connector
+import logging
+import threading
+import time
+
 from mysql.connector import Error, pooling
+from redis.exceptions import RedisError
 from config import config
+from utils.pool_manager import PoolManager
+from utils.db_metrics import instrument
+from utils import replicas
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
 
 # --- Connection pool for main database ---
 try:
@@ -15,71 +25,199 @@ try:
         autocommit=True
     )
 except Error as e:
-    print(f"❌ Error creating main DB pool: {e}")
+    logger.error("Error creating main DB pool: %s", e)
     raise
 
-# --- Dictionary to hold user-specific connection pools ---
-user_db_pools = {}  # user_id -> MySQLConnectionPool
+# --- User-specific connection pools, bounded by one global connection budget ---
+tenant_pools = PoolManager(
+    "tenant",
+    max_connections=config.TENANT_POOL_MAX_CONNECTIONS,
+    pool_size=config.TENANT_POOL_SIZE,
+    idle_seconds=config.TENANT_POOL_IDLE_SECONDS,
+    ping_after=config.DB_POOL_PING_SECONDS,
+)
+
+# --- Main-server connections to an arbitrary database (get_db_connection), one small pool per database ---
+server_pools = PoolManager(
+    "server",
+    max_connections=config.SERVER_POOL_MAX_CONNECTIONS,
+    pool_size=config.SERVER_POOL_SIZE,
+    idle_seconds=config.TENANT_POOL_IDLE_SECONDS,
+    ping_after=config.DB_POOL_PING_SECONDS,
+)
+
+# --- Read-only connections to replicas (main and tenant), keyed by (host, database) ---
+replica_pools = PoolManager(
+    "replica",
+    max_connections=config.REPLICA_POOL_MAX_CONNECTIONS,
+    pool_size=config.REPLICA_POOL_SIZE,
+    idle_seconds=config.TENANT_POOL_IDLE_SECONDS,
+    ping_after=config.DB_POOL_PING_SECONDS,
+)
+
+# --- Tenant connection info cache (db_host/db_user/db_password/db_name per user) ---
+_tenant_info = {}   # user_id -> (expires_at, info, version)
+_tenant_info_lock = threading.Lock()
 
 def get_main_connection():
     """Get a connection from the main DB pool."""
     try:
         conn = main_db_pool.get_connection()
-        return conn
+        return instrument(conn, "main")
     except Error as e:
-        print(f"❌ Error getting main DB connection: {e}")
+        logger.error("Error getting main DB connection: %s", e)
         raise
 
 
-def get_user_connection(user_id):
-    """Get a connection from the user-specific DB pool (create pool if needed)."""
+def _get_replica_connection(host, params, label, tenant=None):
+    """Pooled replica connection, or None (host marked unhealthy) if it cannot be reached."""
+    try:
+        conn = replica_pools.get_connection((host, params["database"]), dict(params, host=host),
+                                            timeout=config.TENANT_POOL_CHECKOUT_TIMEOUT)
+        return instrument(conn, label, tenant)
+    except Error as e:
+        logger.warning("Replica %s unavailable, reading from primary: %s", host, e)
+        replicas.mark_unhealthy(host)
+        return None
+
+
+def get_main_read_connection(user_id=None):
+    """
+    Read-only connection to the main DB: a replica when one is configured and
+    within lag, the primary otherwise or when `user_id` wrote recently.
+    """
+    host = replicas.pick_replica(config.MAIN_DB_REPLICA_HOSTS, user_id)
+    if host:
+        params = {
+            "user": config.MAIN_DB_USER,
+            "password": config.MAIN_DB_PASSWORD,
+            "database": config.MAIN_DB_NAME,
+            "autocommit": True,
+        }
+        conn = _get_replica_connection(host, params, "main-replica")
+        if conn is not None:
+            return conn
+    return get_main_connection()
+
+
+def _load_tenant_info(user_id):
+    main_conn = get_main_connection()
     try:
-        # Get user info from main database
-        main_conn = get_main_connection()
         cur = main_conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+        cur.execute("SELECT db_host, db_user, db_password, db_name FROM users WHERE id = %s", (user_id,))
         user = cur.fetchone()
         cur.close()
+    finally:
         main_conn.close()
+    return user
+
 
-        if not user:
-            raise Exception(f"User {user_id} not found in main database.")
-
-        # Create pool if it doesn't exist
-        if user_id not in user_db_pools:
-            pool_name = f"user_pool_{user_id}"
-            user_db_pools[user_id] = pooling.MySQLConnectionPool(
-                pool_name=pool_name,
-                pool_size=5,  # adjust per user
-                pool_reset_session=True,
-                host=user.get("db_host", config.MAIN_DB_HOST),
-                user=user["db_user"],
-                password=user["db_password"],
-                database=user["db_name"],
-                autocommit=True
-            )
-            print(f"🔗 Created new connection pool for user {user_id}")
-
-        conn = user_db_pools[user_id].get_connection()
-        print(f"✅ Connected to user {user_id}'s DB successfully")
-        return conn
+def _tenant_version(user_id):
+    """Version of the user's row bumped by invalidate_tenant, or None if Redis cannot tell."""
+    try:
+        return get_redis().get(f"tenant:ver:{user_id}") or "0"
+    except RedisError as e:
+        logger.warning("Cannot check tenant cache version for user %s: %s", user_id, e)
+        return None
+
+
+def get_tenant_info(user_id):
+    """
+    Connection settings of a tenant DB, cached for TENANT_INFO_CACHE_SECONDS.
+    Every hit is checked against the version invalidate_tenant bumps in
+    Redis, so a change made by any process is seen by all of them on their
+    next lookup (only the TTL applies while Redis is unreachable). A process
+    that finds the settings changed or the user gone also drops its pool.
+    """
+    user_id = int(user_id)
+    now = time.monotonic()
+    with _tenant_info_lock:
+        cached = _tenant_info.get(user_id)
+    version = _tenant_version(user_id)
+    if cached and cached[0] > now and version in (None, cached[2]):
+        return cached[1]
+
+    user = _load_tenant_info(user_id)
+    if cached and user != cached[1]:
+        tenant_pools.drop(user_id)   # connections were opened with the old settings
+    if not user:
+        with _tenant_info_lock:
+            _tenant_info.pop(user_id, None)
+        raise Exception(f"User {user_id} not found in main database.")
+    with _tenant_info_lock:
+        _tenant_info[user_id] = (now + config.TENANT_INFO_CACHE_SECONDS, user, version)
+    return user
+
+
+def invalidate_tenant(user_id, drop_pool=False):
+    """
+    Forget cached tenant settings in every process (and this process's tenant
+    pool, e.g. when the user is deleted; the others drop theirs on next use).
+    """
+    user_id = int(user_id)
+    with _tenant_info_lock:
+        _tenant_info.pop(user_id, None)
+    try:
+        get_redis().incr(f"tenant:ver:{user_id}")
+    except RedisError as e:
+        logger.warning("Could not invalidate tenant cache of user %s in other processes: %s", user_id, e)
+    if drop_pool:
+        tenant_pools.drop(user_id)
+
+
+def get_user_connection(user_id):
+    """Get a connection from the user-specific DB pool (create pool if needed)."""
+    user_id = int(user_id)
+    try:
+        user = get_tenant_info(user_id)
+        params = {
+            "host": user.get("db_host") or config.MAIN_DB_HOST,
+            "user": user["db_user"],
+            "password": user["db_password"],
+            "database": user["db_name"],
+            "autocommit": True,
+        }
+        conn = tenant_pools.get_connection(user_id, params, timeout=config.TENANT_POOL_CHECKOUT_TIMEOUT)
+        return instrument(conn, "tenant", user_id)
 
     except Error as e:
-        print(f"❌ Error connecting to user {user_id}'s DB: {e}")
+        logger.error("Error connecting to user %s's DB: %s", user_id, e)
         raise
 
 
+def get_user_read_connection(user_id):
+    """Read-only connection to the user's DB, same routing rules as get_main_read_connection."""
+    user_id = int(user_id)
+    user = get_tenant_info(user_id)
+    hosts = config.TENANT_DB_REPLICA_HOSTS.get(user.get("db_host") or config.MAIN_DB_HOST) or []
+    if isinstance(hosts, str):
+        hosts = [hosts]
+    host = replicas.pick_replica(hosts, user_id)
+    if host:
+        params = {
+            "user": user["db_user"],
+            "password": user["db_password"],
+            "database": user["db_name"],
+            "autocommit": True,
+        }
+        conn = _get_replica_connection(host, params, "tenant-replica", user_id)
+        if conn is not None:
+            return conn
+    return get_user_connection(user_id)
+
+
 def get_db_connection(db_name=None):
-    """Get a direct connection to a specified database (optional)."""
+    """Get a pooled connection to a specified database (optional) on the main server."""
     try:
-        conn = mysql.connector.connect(
-            host=config.MAIN_DB_HOST,
-            user=config.MAIN_DB_USER,
-            password=config.MAIN_DB_PASSWORD,
-            database=db_name,
-            autocommit=True
-        )
-        return conn
+        params = {
+            "host": config.MAIN_DB_HOST,
+            "user": config.MAIN_DB_USER,
+            "password": config.MAIN_DB_PASSWORD,
+            "database": db_name,
+            "autocommit": True,
+        }
+        conn = server_pools.get_connection(db_name or "", params, timeout=config.TENANT_POOL_CHECKOUT_TIMEOUT)
+        return instrument(conn, "server", db_name)
     except Error as e:
-        print(f"❌ Error connecting to DB {db_name}: {e}")
+        logger.error("Error connecting to DB %s: %s", db_name, e)
         raise
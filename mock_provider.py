@@ -0,0 +1,146 @@
+# backend/mock_provider.py
+"""
+Local stand-in for an SMS provider, for load tests and benchmarks without
+real credits. It speaks the request shapes of the adapters in utils/providers.py:
+
+    POST /api/sms                 generic / WhySMS ("recipient", comma-separated for bulk)
+    POST /api/sms/send            Termii ("to" array)
+    POST /sms/2/text/advanced     Infobip (per-recipient status)
+
+Behaviour is set on the command line and can be changed while running with
+POST /_mock/config; GET /_mock/stats returns request and recipient counters.
+
+    python mock_provider.py --port 5055 --latency-ms 80 --error-rate 0.01 --throttle-rate 0.02
+
+Point a tenant's sms_api_url at it with SMS_TEST_MODE=true (and
+SMS_PROVIDER_ADAPTERS to pick the bulk adapter for 127.0.0.1).
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+
+settings = {
+    "latency_ms": 50.0,      # mean response time
+    "jitter_ms": 20.0,       # uniform +/- around the mean
+    "error_rate": 0.0,       # share of requests answered with 500
+    "throttle_rate": 0.0,    # share of requests answered with 429
+    "retry_after": 1,        # Retry-After seconds sent with 429
+    "reject_rate": 0.0,      # share of recipients reported as rejected (bulk APIs)
+    "max_recipients": 1000,  # larger requests get 400
+}
+_stats = {"requests": 0, "recipients": 0, "errors": 0, "throttled": 0, "rejected": 0}
+_lock = threading.Lock()
+
+
+def _count(**increments):
+    with _lock:
+        for key, n in increments.items():
+            _stats[key] += n
+
+
+def _simulate(recipients):
+    """Sleep for the configured latency, then return an error response or None."""
+    delay = settings["latency_ms"] + random.uniform(-settings["jitter_ms"], settings["jitter_ms"])
+    time.sleep(max(0.0, delay) / 1000.0)
+    _count(requests=1)
+    roll = random.random()
+    if roll < settings["throttle_rate"]:
+        _count(throttled=1)
+        resp = jsonify({"status": "error", "message": "Too many requests"})
+        resp.headers["Retry-After"] = str(settings["retry_after"])
+        return resp, 429
+    if roll < settings["throttle_rate"] + settings["error_rate"]:
+        _count(errors=1)
+        return jsonify({"status": "error", "message": "Internal error"}), 500
+    if not recipients:
+        return jsonify({"status": "error", "message": "No recipient"}), 400
+    if len(recipients) > settings["max_recipients"]:
+        return jsonify({"status": "error", "message": "Too many recipients"}), 400
+    _count(recipients=len(recipients))
+    return None
+
+
+@app.route("/api/sms", methods=["POST"])
+def generic_send():
+    data = request.get_json(silent=True) or {}
+    recipients = [r for r in str(data.get("recipient") or "").split(",") if r]
+    error = _simulate(recipients)
+    if error:
+        return error
+    return jsonify({"status": "success", "data": {"uid": uuid.uuid4().hex, "recipients": len(recipients)}})
+
+
+@app.route("/api/sms/send", methods=["POST"])
+def termii_send():
+    data = request.get_json(silent=True) or {}
+    recipients = data.get("to") or []
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    error = _simulate(recipients)
+    if error:
+        return error
+    return jsonify({"code": "ok", "message_id": uuid.uuid4().hex, "message": "Successfully Sent"})
+
+
+@app.route("/sms/2/text/advanced", methods=["POST"])
+def infobip_send():
+    data = request.get_json(silent=True) or {}
+    recipients = [d.get("to") for m in data.get("messages") or [] for d in m.get("destinations") or []]
+    error = _simulate(recipients)
+    if error:
+        return error
+    messages = []
+    rejected = 0
+    for phone in recipients:
+        if random.random() < settings["reject_rate"]:
+            rejected += 1
+            status = {"groupName": "REJECTED", "name": "REJECTED_DESTINATION"}
+        else:
+            status = {"groupName": "PENDING", "name": "PENDING_ACCEPTED"}
+        messages.append({"to": phone, "messageId": uuid.uuid4().hex, "status": status})
+    _count(rejected=rejected)
+    return jsonify({"bulkId": uuid.uuid4().hex, "messages": messages})
+
+
+@app.route("/_mock/config", methods=["GET", "POST"])
+def mock_config():
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        unknown = set(data) - set(settings)
+        if unknown:
+            return jsonify({"error": f"Unknown settings: {', '.join(sorted(unknown))}"}), 400
+        for key, value in data.items():
+            settings[key] = type(settings[key])(value)
+    return jsonify(settings)
+
+
+@app.route("/_mock/stats", methods=["GET", "DELETE"])
+def mock_stats():
+    with _lock:
+        snapshot = dict(_stats)
+        if request.method == "DELETE":
+            for key in _stats:
+                _stats[key] = 0
+    return jsonify(snapshot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock SMS provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    for key, value in settings.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=value)
+    args = parser.parse_args()
+    for key in settings:
+        settings[key] = getattr(args, key)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,55 @@ CREATE TABLE IF NOT EXISTS users (
 ALTER TABLE users ADD COLUMN last_sms_message TEXT NULL;
 ALTER TABLE users ADD COLUMN suspended TINYINT(1) DEFAULT 0;
 ALTER TABLE users ADD COLUMN IF NOT EXISTS company_type VARCHAR(100);
+ALTER TABLE users ADD COLUMN IF NOT EXISTS sms_rate_limit FLOAT NULL;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS sms_rate_burst INT NULL;
+
+-- Pre-created tenant databases claimed at registration (utils/provisioning.py)
+CREATE TABLE IF NOT EXISTS tenant_spares (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    db_name VARCHAR(100) NOT NULL UNIQUE,
+    db_user VARCHAR(100) NOT NULL UNIQUE,
+    db_password VARCHAR(255) NOT NULL,
+    db_host VARCHAR(100) NOT NULL DEFAULT 'localhost',
+    claimed_by INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP NULL,
+    INDEX idx_spares_claimed (claimed_by, id)
+);
+
+-- Background contact imports (routes/upload.py); next_row is the resume checkpoint
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id CHAR(36) PRIMARY KEY,
+    user_id INT NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    path VARCHAR(512) NOT NULL,
+    status ENUM('queued','running','completed','failed') NOT NULL DEFAULT 'queued',
+    next_row INT NOT NULL DEFAULT 0,
+    rows_read INT NOT NULL DEFAULT 0,
+    total INT NOT NULL DEFAULT 0,
+    inserted INT NOT NULL DEFAULT 0,
+    skipped INT NOT NULL DEFAULT 0,
+    elapsed_seconds FLOAT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_import_jobs_user (user_id, created_at)
+);
+
+-- Registrations: reserve the username (pending_username, cleared when done) until the user row exists;
+-- those without a spare database wait here for one to be created
+CREATE TABLE IF NOT EXISTS registration_jobs (
+    id CHAR(36) PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    pending_username VARCHAR(50) NULL UNIQUE,
+    status ENUM('pending','provisioning','completed','failed') NOT NULL DEFAULT 'pending',
+    payload TEXT NULL,
+    user_id INT NULL,
+    db_name VARCHAR(100) NULL,
+    error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
 
 
 
@@ -49,7 +98,9 @@ CREATE TABLE users (
     sms_sending TINYINT(1) DEFAULT 0,
     last_sms_message TEXT DEFAULT NULL,
     suspended TINYINT(1) DEFAULT 0,
-    company_type VARCHAR(100) DEFAULT NULL
+    company_type VARCHAR(100) DEFAULT NULL,
+    sms_rate_limit FLOAT DEFAULT NULL,   -- per-tenant msgs/s cap (NULL = provider limit only)
+    sms_rate_burst INT DEFAULT NULL
 );
 
 
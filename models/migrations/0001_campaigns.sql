@@ -0,0 +1,15 @@
+-- Bring tenants created before the campaigns table was added to models/user_schema.sql up to date:
+-- keyset index for the retry pass and the campaigns table.
+ALTER TABLE sent_messages ADD INDEX idx_sent_status_id (status, id), ALGORITHM=INPLACE, LOCK=NONE;
+
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    message TEXT,
+    status ENUM('running','stopped','completed') DEFAULT 'running',
+    phase ENUM('initial','retry') DEFAULT 'initial',
+    last_customer_id INT DEFAULT 0,
+    retry_cursor INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_campaigns_status (status)
+);
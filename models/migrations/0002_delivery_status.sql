@@ -0,0 +1,3 @@
+-- Delivery-receipt columns for tenants created before they were added to models/user_schema.sql.
+ALTER TABLE sent_messages ADD COLUMN delivery_status VARCHAR(20) NULL, ALGORITHM=INSTANT;
+ALTER TABLE sent_messages ADD COLUMN delivery_updated_at TIMESTAMP NULL, ALGORITHM=INSTANT;
@@ -0,0 +1,2 @@
+-- Last outbox stream entry applied to each row (utils/outbox.py), so a replayed entry is not counted twice.
+ALTER TABLE sent_messages ADD COLUMN outbox_entry VARCHAR(32) NULL, ALGORITHM=INSTANT;
@@ -11,6 +11,28 @@ CREATE TABLE IF NOT EXISTS sent_messages (
     message TEXT,
     status ENUM('sent','failed','pending') DEFAULT 'pending',
     retries INT DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    delivery_status VARCHAR(20) NULL,
+    delivery_updated_at TIMESTAMP NULL,
+    outbox_entry VARCHAR(32) NULL,
+    INDEX idx_sent_status_id (status, id)
+);
+
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    message TEXT,
+    status ENUM('running','stopped','completed') DEFAULT 'running',
+    phase ENUM('initial','retry') DEFAULT 'initial',
+    last_customer_id INT DEFAULT 0,
+    retry_cursor INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_campaigns_status (status)
 );
 
+-- Applied files of models/migrations (utils/migrations.py)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
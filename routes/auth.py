@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
 from werkzeug.security import generate_password_hash, check_password_hash
-from db import get_main_connection
-from utils.helpers import create_user_database
+from db import get_main_connection, get_main_read_connection
+from utils.provisioning import UsernameTaken, get_registration_job, register_account
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from flask_mail import Message, Mail
 
@@ -28,28 +28,23 @@ def register():
     # ✅ New field
     company_type = data.get("company_type", "General")  # Default if not provided
 
-    # Create individual database for the user
-    db_name, db_user, db_password = create_user_database(username)
+    account = {
+        "username": username, "password_hash": password, "email": email,
+        "sms_api_url": sms_api_url, "sms_api_token": sms_api_token, "sms_sender_id": sms_sender_id,
+        "sms_quota": sms_quota, "company_type": company_type,
+    }
 
-    conn = get_main_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO users (
-            username, password_hash, email,
-            db_name, db_user, db_password,
-            sms_api_url, sms_api_token, sms_sender_id,
-            sms_quota, sms_used, company_type
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, %s)
-    """, (
-        username, password, email,
-        db_name, db_user, db_password,
-        sms_api_url, sms_api_token, sms_sender_id,
-        sms_quota, company_type
-    ))
-    conn.commit()
-    cur.close()
-    conn.close()
+    # Claim a pre-created database; without a spare, provision in the background
+    try:
+        outcome, job_or_user_id, db_name = register_account(account)
+    except UsernameTaken:
+        return jsonify({"error": "Username already exists"}), 409
+    if outcome == "queued":
+        return jsonify({
+            "message": f"User '{username}' is being created.",
+            "job_id": job_or_user_id,
+            "status_url": f"/api/auth/register/{job_or_user_id}"
+        }), 202
 
     return jsonify({
         "message": f"✅ User '{username}' created successfully.",
@@ -58,6 +53,15 @@ def register():
         "company_type": company_type
     }), 201
 
+
+@auth_bp.route("/register/<job_id>", methods=["GET"])
+def registration_status(job_id):
+    # Unauthenticated (the account does not exist yet): status only, no account details
+    job = get_registration_job(job_id)
+    if not job:
+        return jsonify({"error": "Registration job not found"}), 404
+    return jsonify({"job_id": job["id"], "status": job["status"]}), 200
+
 # ---------------- LOGIN ----------------
 @auth_bp.route("/login", methods=["POST"])
 def login():
@@ -90,7 +94,7 @@ def login():
 @jwt_required()
 def get_profile():
     user_id = get_jwt_identity()
-    conn = get_main_connection()
+    conn = get_main_read_connection(user_id)
     cur = conn.cursor(dictionary=True)
     cur.execute("""
         SELECT username, sms_sender_id, sms_quota, sms_used, is_admin
@@ -116,7 +120,7 @@ def get_profile():
 @jwt_required()
 def get_sms_quota():
     user_id = get_jwt_identity()
-    conn = get_main_connection()
+    conn = get_main_read_connection(user_id)
     cur = conn.cursor(dictionary=True)
     cur.execute("SELECT sms_used, sms_quota, sms_sender_id FROM users WHERE id=%s", (user_id,))
     user = cur.fetchone()
@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from db import get_user_connection, get_db_connection
+from db import get_user_connection, get_user_read_connection, get_db_connection
 from datetime import datetime
+from utils.phone import normalize_phone
 
 contacts_bp = Blueprint("contacts", __name__)
 
@@ -13,6 +14,13 @@ def get_connection(user_id, database=None):
     return get_user_connection(user_id)      # ✅ Fallback to user's default DB
 
 
+def get_read_connection(user_id, database=None):
+    """Like get_connection, but the user's own DB may be served by a replica."""
+    if database:
+        return get_db_connection(database)
+    return get_user_read_connection(user_id)
+
+
 # --- GET ALL CONTACTS ---
 @contacts_bp.route("/contacts", methods=["GET"])
 @jwt_required()
@@ -20,7 +28,7 @@ def get_contacts():
     user_id = get_jwt_identity()
     database = request.args.get("database")  # ✅ Accept ?database=name
     try:
-        conn = get_connection(user_id, database)
+        conn = get_read_connection(user_id, database)
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT id, name, phone, created_at FROM customers ORDER BY id DESC")
         rows = cursor.fetchall()
@@ -70,12 +78,10 @@ def add_contact():
         return jsonify({"error": "Phone number is required"}), 400
 
     # Normalize phone
-    if phone.startswith("+"):
-        phone = phone[1:]
-    if phone.startswith("0"):
-        phone = "20" + phone[1:]
-    if not phone.isdigit() or not phone.startswith("20") or len(phone) != 12:
-        return jsonify({"error": "Invalid phone number. Must start with '20' and be 12 digits long."}), 400
+    raw_phone = phone
+    phone = normalize_phone(raw_phone)
+    if not phone:
+        return jsonify({"error": f"Invalid phone number: {raw_phone}"}), 400
 
     try:
         conn = get_connection(user_id, database)
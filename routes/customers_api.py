@@ -1,7 +1,7 @@
 # customers_api.py
 from flask import Blueprint, request, jsonify, Response
 from db import get_db_connection
-from utils.helpers import normalize_phone
+from utils.phone import normalize_phones
 from routes.db_api import retry_on_deadlock
 import csv
 import io
@@ -27,19 +27,20 @@ def save_customers():
         if not customers:
             return jsonify({"error": "No customers provided"}), 400
 
+        phones = normalize_phones([c.get("phone", "") for c in customers])
         rows = []
-        for c in customers:
+        rejected = 0
+        for c, phone in zip(customers, phones):
             name = (c.get("name") or "").strip()
-            phone_raw = c.get("phone", "")
-            phone = normalize_phone(phone_raw)
 
             if not phone:
+                rejected += 1
                 continue
 
             rows.append(( name, phone))
 
         if not rows:
-            return jsonify({"error": "No valid customers after normalization"}), 400
+            return jsonify({"error": "No valid customers after normalization", "rejected": rejected}), 400
 
         CHUNK_SIZE = 300
         total_affected = 0
@@ -60,6 +61,7 @@ def save_customers():
             "success": True,
             "affected_rows": total_affected,
             "submitted": total_submitted,
+            "rejected": rejected,  # invalid phone numbers, not saved
             "database": database  # ✅ Return for confirmation
         })
 
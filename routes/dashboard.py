@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from db import get_user_connection
+from db import get_user_read_connection
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
@@ -13,7 +13,7 @@ def get_user_dashboard_stats():
     user_id = get_jwt_identity()
 
     try:
-        conn = get_user_connection(user_id)
+        conn = get_user_read_connection(user_id)
         cursor = conn.cursor(dictionary=True)
 
         print(f"📊 User {user_id} requested dashboard stats")
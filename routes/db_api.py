@@ -1,6 +1,9 @@
 # api/db_api.py
-from flask import Blueprint, jsonify
-from db import get_db_connection
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import get_db_connection, tenant_pools, server_pools
+from routes.users import is_admin
+from utils import db_metrics
 import time
 import random
 import mysql.connector
@@ -30,6 +33,29 @@ def list_databases():
         }), 500
 
 
+# --- Tenant and server pool utilization (admin only) ---
+@db_bp.route("/pools", methods=["GET"])
+@jwt_required()
+def pool_stats():
+    if not is_admin(get_jwt_identity()):
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({"tenant": tenant_pools.stats(), "server": server_pools.stats()})
+
+
+# --- Statement latency by endpoint/task (admin only); ?order_by=total_ms|avg_ms|max_ms|count ---
+@db_bp.route("/query-stats", methods=["GET", "DELETE"])
+@jwt_required()
+def query_stats():
+    if not is_admin(get_jwt_identity()):
+        return jsonify({"error": "Unauthorized"}), 403
+    if request.method == "DELETE":
+        db_metrics.reset()
+        return jsonify({"message": "Query stats reset"}), 200
+    limit = request.args.get("limit", 50, type=int)
+    order_by = request.args.get("order_by", "total_ms")
+    return jsonify(db_metrics.stats(limit, order_by))
+
+
 def retry_on_deadlock(max_retries=4, initial_delay=0.1, backoff=2.0, jitter=0.05):
     """
     Decorator to retry a DB function when a MySQL deadlock (ER_LOCK_DEADLOCK / errno 1213) occurs.
@@ -0,0 +1,192 @@
+# backend/routes/dlr.py
+"""
+Delivery-receipt (DLR) callbacks from SMS providers.
+
+Providers POST to /api/dlr/<user_id>/<token>. The request only parses the
+reports and appends them to a Redis list; the dlr.flush_reports task applies
+them to the tenant sent_messages tables in bulk (one UPDATE per tenant per
+flush), so no tenant connection is opened per callback. Reports a tenant
+could not take DLR_MAX_ATTEMPTS times are moved to the dlr:dead list.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+from flask import Blueprint, jsonify, request, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from celery_app import celery_app
+from config import config
+from db import get_user_connection
+from utils.redis_client import get_redis
+
+dlr_bp = Blueprint("dlr", __name__)
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "dlr:queue"
+LOCK_KEY = "dlr:flush_lock"
+KICK_KEY = "dlr:kick"
+DEAD_KEY = "dlr:dead"
+DEAD_MAX = 100000   # newest dead-lettered reports kept for inspection / replay
+
+# Provider status words -> sent_messages.delivery_status
+_STATUS_MAP = {
+    "delivered": "delivered", "delivrd": "delivered", "success": "delivered",
+    "undelivered": "undelivered", "undeliverable": "undelivered", "undeliv": "undelivered",
+    "failed": "undelivered", "rejected": "undelivered", "rejectd": "undelivered",
+    "expired": "undelivered", "dnd active on phone number": "undelivered",
+    "pending": "pending", "sent": "pending", "accepted": "pending", "enroute": "pending",
+    "message sent": "pending",
+}
+
+
+def dlr_token(user_id):
+    """Per-tenant secret in the callback URL; verified without a DB lookup."""
+    return hmac.new(config.JWT_SECRET_KEY.encode(), f"dlr:{user_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _report(item):
+    """(phone, delivery_status) from one provider report dict, or None if unusable."""
+    phone = (item.get("to") or item.get("phone_number") or item.get("phone")
+             or item.get("recipient") or item.get("msisdn"))
+    status = item.get("status") or item.get("dlr_status") or item.get("delivery_status")
+    if isinstance(status, dict):   # Infobip: {"groupName": "DELIVERED", "name": "DELIVERED_TO_HANDSET"}
+        status = status.get("groupName") or status.get("name")
+    if not phone or not status:
+        return None
+    phone = str(phone).strip().lstrip("+")
+    return phone, _STATUS_MAP.get(str(status).strip().lower(), "unknown")
+
+
+def parse_reports(data):
+    """Reports from a single report, a list, or an Infobip/generic envelope."""
+    if isinstance(data, dict):
+        items = data.get("results") or data.get("reports") or data.get("data") or [data]
+    elif isinstance(data, list):
+        items = data
+    else:
+        items = []
+    reports = []
+    for item in items:
+        if isinstance(item, dict):
+            report = _report(item)
+            if report:
+                reports.append(report)
+    return reports
+
+
+@dlr_bp.route("/<int:user_id>/<token>", methods=["POST"])
+def receive_dlr(user_id, token):
+    if not hmac.compare_digest(token, dlr_token(user_id)):
+        return jsonify({"error": "Invalid callback token"}), 403
+
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form.to_dict() or request.args.to_dict()
+    reports = parse_reports(data)
+    if reports:
+        now = time.time()
+        client = get_redis()
+        client.rpush(QUEUE_KEY, *[json.dumps([user_id, phone, status, now]) for phone, status in reports])
+        # One pending flush at a time; it drains everything queued meanwhile
+        if client.set(KICK_KEY, 1, nx=True, ex=config.DLR_FLUSH_DELAY_SECONDS + 1):
+            flush_dlr_reports.apply_async(countdown=config.DLR_FLUSH_DELAY_SECONDS)
+
+    return jsonify({"status": "ok", "accepted": len(reports)}), 200
+
+
+@dlr_bp.route("/callback-url", methods=["GET"])
+@jwt_required()
+def get_callback_url():
+    """The DLR URL to configure at the provider for the logged-in tenant."""
+    user_id = int(get_jwt_identity())
+    return jsonify({"url": url_for("dlr.receive_dlr", user_id=user_id, token=dlr_token(user_id), _external=True)})
+
+
+def _apply_reports(user_id, reports):
+    """One UPDATE for all of a tenant's reports (last report per phone wins)."""
+    latest = {}
+    for phone, status in reports:
+        latest[phone] = status
+    conn = get_user_connection(user_id)
+    try:
+        cur = conn.cursor()
+        cases = " ".join(["WHEN %s THEN %s"] * len(latest))
+        placeholders = ",".join(["%s"] * len(latest))
+        params = []
+        for phone, status in latest.items():
+            params.extend([phone, status])
+        params.extend(latest.keys())
+        cur.execute(f"""
+            UPDATE sent_messages
+            SET delivery_status = CASE phone {cases} END,
+                delivery_updated_at = NOW()
+            WHERE phone IN ({placeholders})
+        """, params)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+@celery_app.task(name="dlr.flush_reports")
+def flush_dlr_reports():
+    """
+    Drain the DLR queue in chunks of DLR_FLUSH_BATCH, grouped per tenant.
+    Entries are trimmed only after their chunk was applied, and a lock keeps a
+    single flusher, so a crash replays the chunk instead of losing it.
+    """
+    client = get_redis()
+    client.delete(KICK_KEY)
+    if not client.set(LOCK_KEY, 1, nx=True, ex=config.DLR_FLUSH_LOCK_SECONDS):
+        # Another flush is finishing and may not see what was queued since: look again shortly
+        if client.set(KICK_KEY, 1, nx=True, ex=config.DLR_FLUSH_DELAY_SECONDS + 1):
+            flush_dlr_reports.apply_async(countdown=config.DLR_FLUSH_DELAY_SECONDS)
+        return {"status": "busy"}
+
+    applied = 0
+    failed = False
+    try:
+        while not failed:
+            raw = client.lrange(QUEUE_KEY, 0, config.DLR_FLUSH_BATCH - 1)
+            if not raw:
+                break
+            by_tenant = {}
+            for entry in raw:
+                user_id, phone, status, _, *attempts = json.loads(entry)
+                by_tenant.setdefault(user_id, []).append((phone, status, attempts[0] if attempts else 0))
+
+            for user_id, reports in by_tenant.items():
+                try:
+                    _apply_reports(user_id, [(p, s) for p, s, _ in reports])
+                    applied += len(reports)
+                except Exception as exc:
+                    # Keep the other tenants moving; this tenant's reports go to the back of the
+                    # queue, or to the dead-letter list once they have failed too often
+                    logger.exception("Could not apply %d DLRs for user %s: %s", len(reports), user_id, exc)
+                    now = time.time()
+                    retry = [json.dumps([user_id, p, s, now, n + 1]) for p, s, n in reports
+                             if n + 1 < config.DLR_MAX_ATTEMPTS]
+                    dead = [json.dumps([user_id, p, s, now, n + 1]) for p, s, n in reports
+                            if n + 1 >= config.DLR_MAX_ATTEMPTS]
+                    if retry:
+                        failed = True
+                        client.rpush(QUEUE_KEY, *retry)
+                    if dead:
+                        logger.error("Dead-lettering %d DLRs for user %s after %d attempts",
+                                     len(dead), user_id, config.DLR_MAX_ATTEMPTS)
+                        client.rpush(DEAD_KEY, *dead)
+                        client.ltrim(DEAD_KEY, -DEAD_MAX, -1)
+
+            client.ltrim(QUEUE_KEY, len(raw), -1)
+            client.expire(LOCK_KEY, config.DLR_FLUSH_LOCK_SECONDS)
+    finally:
+        client.delete(LOCK_KEY)
+
+    if failed:
+        # Retry the requeued reports later instead of spinning on a tenant DB that is down
+        flush_dlr_reports.apply_async(countdown=config.DLR_FLUSH_LOCK_SECONDS // 4)
+    logger.info("Applied %d delivery reports", applied)
+    return {"status": "ok", "applied": applied}
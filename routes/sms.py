@@ -1,176 +1,569 @@
 # backend/routes/sms.py
 import logging
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from celery_app import celery_app
 from utils.sms_utils import is_allowed_api_url, mask_token, retry_post
+from utils.rate_limit import sms_limiter, provider_host
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.providers import get_provider, pack_messages
+from utils import outbox
+from utils.campaigns import (create_campaign, get_campaign, next_batch, save_checkpoint,
+                             rewind_checkpoint, stop_campaign, stop_running_campaigns, count_recipients)
+from utils.progress import start_progress, record_progress, clear_progress, get_progress
+from utils import quota
+from utils.templating import MessageTemplate, text_segments
+from utils.scheduler import submit, dispatch, release, queue_stats, tenant_cap
+from routes.users import is_admin
 from db import get_user_connection, get_main_connection
 from config import config
 import requests
 import time
+import json
+import threading
+import uuid
+from redis.exceptions import RedisError
+from utils.redis_client import get_redis
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 sms_bp = Blueprint("sms", __name__)
 logger = logging.getLogger(__name__)
 
-# Track progress per user in-memory (optional, can later use Redis for persistence)
-sms_progress = {}  # user_id -> {"sent": int, "failed": int}
+_sessions = {}  # concurrency -> requests.Session, reused by every task in this worker process
+_sessions_lock = threading.Lock()
 
-def send_user_sms_batch_runner(user_id, message=None, **kwargs):
+
+def _build_session(concurrency):
+    """requests.Session whose connection pool keeps one connection per in-flight request."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_session(concurrency):
+    """Process-wide pooled session, so keep-alive connections and TLS sessions survive across batches."""
+    with _sessions_lock:
+        if concurrency not in _sessions:
+            _sessions[concurrency] = _build_session(concurrency)
+        return _sessions[concurrency]
+
+
+def _send_request(session, provider, user_id, sms_api_url, sms_token, sender_id, messages, breaker=None):
     """
-    Runner that performs the sending logic synchronously.
-    Called by Celery task. Requires a message argument from frontend.
+    POST one provider request carrying `messages` [(phone, text), ...].
+    Returns {phone: accepted} for every recipient in the request.
+    CircuitOpenError propagates: nothing was sent and the caller should defer.
     """
-    if not message or not message.strip():
-        raise ValueError("Message argument is required")
+    payload, headers = provider.build_request(messages, sender_id, sms_token)
+    phones = [phone for phone, _ in messages]
 
-    main_conn = None
-    user_conn = None
     try:
-        main_conn = get_main_connection()
+        resp = retry_post(session.post, sms_api_url, payload, headers, timeout=10, retries=3, breaker=breaker)
+        data = resp.json() if resp.content else {}
+
+        logger.info(
+            "SMS user=%s recipients=%d first=%s code=%s resp=%s token=%s",
+            user_id, len(phones), phones[0], resp.status_code, data, mask_token(sms_token)
+        )
+        return provider.parse_response(resp, data, messages)
+
+    except CircuitOpenError:
+        raise
+    except Exception as exc:
+        logger.exception("Exception sending SMS to %s for user %s: %s", ",".join(phones), user_id, exc)
+        return {phone: False for phone in phones}
+
+
+def _dispatch(send, items, concurrency):
+    """
+    Yield send(item) for every item, in order, keeping up to `concurrency`
+    calls in flight. concurrency=1 runs inline without a thread pool.
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield send(item)
+        return
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        yield from pool.map(send, items)
+
+
+def _load_user_info(user_id):
+    """Provider settings and sending state of a tenant from the main DB (None if unknown)."""
+    main_conn = get_main_connection()
+    try:
         mcur = main_conn.cursor(dictionary=True)
         mcur.execute("""
-            SELECT sms_api_url, sms_api_token, sms_sender_id, sms_quota, sms_used, sms_sending
+            SELECT sms_api_url, sms_api_token, sms_sender_id, sms_quota, sms_used, sms_sending,
+                   sms_rate_limit, sms_rate_burst
             FROM users WHERE id=%s
         """, (user_id,))
         user_info = mcur.fetchone()
         mcur.close()
+    finally:
+        main_conn.close()
+    return user_info
+
 
+class CampaignSender:
+    """
+    Sends one tenant's campaign batch by batch.
+
+    Everything that is expensive to rebuild (provider settings from the main
+    DB, provider adapter, rate limiter, HTTP session, tenant connection) is
+    loaded once and reused across batches. Stop and provider changes are picked
+    up by re-reading the user row every SMS_CONTROL_REFRESH_SECONDS; quota is
+    reserved per batch from the Redis ledger in utils/quota.py.
+    """
+
+    def __init__(self, user_id, message, campaign_id=None):
+        if not message or not message.strip():
+            raise ValueError("Message argument is required")
+        self.user_id = user_id
+        self.message = message
+        self.text = message.strip()
+        self.campaign_id = campaign_id
+        self.template = MessageTemplate(self.text)   # compiled once for the whole campaign
+        self.concurrency = max(1, config.SMS_SEND_CONCURRENCY)
+        self.session = _get_session(self.concurrency)
+        self.user_info = None
+        self.refreshed_at = 0.0
+        self.provider = None
+        self.limiter = None
+        self.breaker = None
+        self.user_conn = None
+
+    # --- provider settings / control state ---
+    def refresh(self):
+        user_info = _load_user_info(self.user_id)
+        self.refreshed_at = time.monotonic()
+        previous = self.user_info
+        self.user_info = user_info
         if not user_info:
-            logger.error("User %s not found in main DB", user_id)
+            return
+        if previous is None or any(previous.get(k) != user_info.get(k) for k in
+                                   ("sms_api_url", "sms_rate_limit", "sms_rate_burst")):
+            self.provider = get_provider(user_info.get("sms_api_url"))
+            self.breaker = CircuitBreaker(provider_host(user_info.get("sms_api_url")))
+            self.limiter = None
+            if config.SMS_RATE_LIMIT_ENABLED:
+                self.limiter = sms_limiter(self.user_id, user_info.get("sms_api_url"),
+                                           user_info.get("sms_rate_limit"), user_info.get("sms_rate_burst"))
+
+    def check(self):
+        """Return a terminal result dict if the campaign must not continue, else None."""
+        if self.user_info is None or time.monotonic() - self.refreshed_at >= config.SMS_CONTROL_REFRESH_SECONDS:
+            self.refresh()
+
+        if not self.user_info:
+            logger.error("User %s not found in main DB", self.user_id)
             return {"status": "error", "message": "user_not_found"}
 
-        if not user_info.get("sms_sending"):
-            logger.info("SMS sending disabled for user %s, skipping batch", user_id)
+        if not self.user_info.get("sms_sending"):
+            logger.info("SMS sending disabled for user %s, skipping batch", self.user_id)
             return {"status": "stopped"}
 
-        sms_api_url = user_info.get("sms_api_url")
-        sms_token = user_info.get("sms_api_token")
-        sender_id = user_info.get("sms_sender_id")
-        quota = int(user_info.get("sms_quota") or 0)
-        used = int(user_info.get("sms_used") or 0)
-        remaining = quota - used if quota else None
-
-        if not is_allowed_api_url(sms_api_url):
-            logger.error("Blocked unsafe sms_api_url for user %s: %s", user_id, sms_api_url)
+        if not is_allowed_api_url(self.user_info.get("sms_api_url")):
+            logger.error("Blocked unsafe sms_api_url for user %s: %s", self.user_id, self.user_info.get("sms_api_url"))
             return {"status": "error", "message": "blocked_api_url"}
 
-        user_conn = get_user_connection(user_id)
-        ucur = user_conn.cursor(dictionary=True)
-        limit = min(config.SMS_BATCH_SIZE, remaining or config.SMS_BATCH_SIZE)
-        ucur.execute("""
-            SELECT c.phone, COALESCE(s.retries, 0) AS retries, s.status
-            FROM customers c
-            LEFT JOIN sent_messages s ON c.phone = s.phone
-            WHERE s.phone IS NULL
-            OR (s.status = 'failed' AND s.retries < 3)
-            LIMIT %s;
-        """, (limit,))
-        customers = ucur.fetchall()
-
-        session = requests.Session()
-        sent = 0
-        failed = 0
-
-        for cust in customers:
-            phone = cust.get("phone")
-            retries = int(cust.get("retries", 0))
-            sent_status = cust.get("status")
-            if sent_status == "sent":
-                logger.info("Skipping phone %s: already sent", phone)
-                continue
-
-            payload = {
-                "recipient": phone,
-                "sender_id": sender_id,
-                "type": "plain",
-                "message": message.strip(),
-            }
-            headers = {
-                "Authorization": f"Bearer {sms_token}",
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
+        return None
 
-            try:
-                resp = retry_post(session.post, sms_api_url, payload, headers, timeout=10, retries=3)
-                data = resp.json() if resp.content else {}
-
-                logger.info(
-                    "SMS user=%s phone=%s code=%s resp=%s token=%s",
-                    user_id, phone, resp.status_code, data, mask_token(sms_token)
-                )
-
-                if resp.status_code == 200 and data.get("status") == "success":
-                    ucur.execute("""
-                        INSERT INTO sent_messages (phone, message, status, retries)
-                        VALUES (%s, %s, 'sent', 0)
-                        ON DUPLICATE KEY UPDATE status='sent', retries=0;
-                    """, (phone, message))
-                    sent += 1
-                else:
-                    ucur.execute("""
-                        INSERT INTO sent_messages (phone, message, status, retries)
-                        VALUES (%s, %s, 'failed', %s)
-                        ON DUPLICATE KEY UPDATE status='failed', retries=retries+1;
-                    """, (phone, message, retries + 1))
-                    failed += 1
-
-                user_conn.commit()
-
-            except Exception as exc:
-                logger.exception("Exception sending SMS to %s for user %s: %s", phone, user_id, exc)
-                ucur.execute("""
-                    INSERT INTO sent_messages (phone, message, status, retries)
-                    VALUES (%s, %s, 'failed', %s)
-                    ON DUPLICATE KEY UPDATE status='failed', retries=retries+1;
-                """, (phone, message, retries + 1))
-                user_conn.commit()
-                failed += 1
-
-            time.sleep(config.SEND_DELAY_SECONDS)
-
-        if sent > 0:
+    def _set_sending(self, enabled):
+        main_conn = get_main_connection()
+        try:
             mcur = main_conn.cursor()
-            mcur.execute("UPDATE users SET sms_used = sms_used + %s WHERE id = %s", (sent, user_id))
+            mcur.execute("UPDATE users SET sms_sending = %s WHERE id = %s", (enabled, self.user_id))
             main_conn.commit()
             mcur.close()
+        finally:
+            main_conn.close()
+        self.user_info["sms_sending"] = enabled
+
+    # --- sending ---
+    def _campaign(self):
+        if self.user_conn is None:
+            self.user_conn = get_user_connection(self.user_id)
+        if self.campaign_id is None:
+            self.campaign_id = create_campaign(self.user_conn, self.text)
+        return get_campaign(self.user_conn, self.campaign_id)
+
+    def send_batch(self):
+        """Send the next batch of the campaign. Returns the batch result dict."""
+        stop = self.check()
+        if stop:
+            return stop
+
+        campaign = self._campaign()
+        if not campaign or campaign["status"] != "running":
+            logger.info("Campaign %s for user %s is not running, skipping batch", self.campaign_id, self.user_id)
+            return {"status": "stopped", "campaign_id": self.campaign_id}
+
+        # SMS_BATCH_SIZE counts provider requests; bulk providers carry many recipients each
+        batch_size = config.SMS_BATCH_SIZE * self.provider.max_recipients
+        pending, checkpoint = next_batch(self.user_conn, campaign, batch_size)
+        if checkpoint["phase"] == "retry" and outbox.pending(self.user_id) != 0:
+            # The retry pass reads failures from sent_messages; wait until the outbox has written them
+            # (or until Redis can say it has)
+            logger.info("Outbox not drained for user %s, deferring retry pass of campaign %s",
+                        self.user_id, self.campaign_id)
+            return {"status": "deferred", "retry_in": config.OUTBOX_FLUSH_DELAY_SECONDS,
+                    "campaign_id": self.campaign_id}
+        rendered = self.template.render_batch(pending)
+        costs = [r.segments if config.SMS_QUOTA_COUNT_SEGMENTS else 1 for r in rendered]
+
+        # Quota is reserved before dispatch so concurrent senders can never overrun it;
+        # recipients beyond the grant are left for later by rewinding the cursor to them
+        reservation, granted = quota.reserve(self.user_id, sum(costs)) if pending else (None, 0)
+        fit = 0
+        for cost in costs:
+            if cost > granted:
+                break
+            granted -= cost
+            fit += 1
+        if fit < len(pending):
+            if fit == 0:
+                quota.commit(self.user_id, reservation, 0)
+                logger.info("SMS quota exhausted for user %s", self.user_id)
+                # Nothing else will run for this user: write the usage counted so far to sms_used now
+                try:
+                    quota.reconcile(self.user_id, force=True)
+                except Exception as exc:
+                    logger.warning("Could not sync sms_used for user %s (will retry): %s", self.user_id, exc)
+                self._set_sending(False)
+                return {"status": "quota_exhausted", "campaign_id": self.campaign_id}
+            checkpoint = rewind_checkpoint(campaign, checkpoint, pending[fit])
+            pending, rendered, costs = pending[:fit], rendered[:fit], costs[:fit]
+
+        results_buffer = outbox.result_buffer(self.user_id, self.user_conn)
+        try:
+            checkpoint, deferred_for = self._send_recipients(campaign, checkpoint, pending, rendered, costs,
+                                                             results_buffer)
+        finally:
+            # Only committed sends count; the unused part of the reservation goes back
+            if reservation:
+                quota.commit(self.user_id, reservation, results_buffer.sent_units)
+        sent = results_buffer.sent
+        failed = results_buffer.failed
+        try:
+            quota.reconcile(self.user_id, force=checkpoint["status"] == "completed")
+        except Exception as exc:
+            logger.warning("Could not sync sms_used for user %s (will retry): %s", self.user_id, exc)
+
+        record_progress(self.user_id, self.campaign_id, sent, failed, retry=campaign["phase"] == "retry")
+
+        if deferred_for:
+            logger.info("Provider circuit open for user %s, deferring campaign %s for %.1fs",
+                        self.user_id, self.campaign_id, deferred_for)
+            return {"status": "deferred", "retry_in": deferred_for, "sent": sent, "failed": failed,
+                    "campaign_id": self.campaign_id}
+
+        if checkpoint["status"] == "completed":
+            self._set_sending(False)
+            logger.info("Campaign %s for user %s completed", self.campaign_id, self.user_id)
+            return {"status": "completed", "sent": sent, "failed": failed, "campaign_id": self.campaign_id}
+
+        return {"status": "ok", "sent": sent, "failed": failed, "campaign_id": self.campaign_id}
+
+    def _send_recipients(self, campaign, checkpoint, pending, rendered, costs, results_buffer):
+        """
+        Dispatch the rendered messages for `pending` into results_buffer and save
+        the checkpoint. Returns (checkpoint, deferred_for): when the provider
+        circuit opened, deferred_for is the wait in seconds and the checkpoint
+        points back at the first recipient that was not sent.
+        """
+        provider = self.provider
+        limiter = self.limiter
+        breaker = self.breaker
+        sms_api_url = self.user_info.get("sms_api_url")
+        sms_token = self.user_info.get("sms_api_token")
+        sender_id = self.user_info.get("sms_sender_id")
+
+        rows_by_phone = {}
+        for cust, cost in zip(pending, costs):
+            rows_by_phone[cust.get("phone")] = (cust, cost)
+        messages = [(cust.get("phone"), r.text) for cust, r in zip(pending, rendered)]
+        provider_requests = pack_messages(provider, messages)
+        deferred = []  # (retry_in, request index) for requests refused by the open circuit
+
+        def send(indexed):
+            index, messages = indexed
+            try:
+                breaker.check()
+                if limiter:
+                    limiter.acquire(len(messages))
+                results = _send_request(self.session, provider, self.user_id, sms_api_url, sms_token,
+                                        sender_id, messages, breaker)
+            except CircuitOpenError as exc:
+                deferred.append((exc.retry_in, index))
+                return None
+            if not limiter:
+                time.sleep(config.SEND_DELAY_SECONDS)
+            return results
+
+        # Outcomes come back in recipient order, so the buffered writes match the serial path exactly.
+        # Deferred requests are not recorded: the recipients stay untouched for the next batch.
+        try:
+            for messages, results in zip(provider_requests,
+                                         _dispatch(send, list(enumerate(provider_requests)), self.concurrency)):
+                if results is None:
+                    continue
+                for phone, text in messages:
+                    cust, cost = rows_by_phone[phone]
+                    results_buffer.add(phone, text, results.get(phone), cust.get("retries", 0), cost)
+        finally:
+            results_buffer.flush()
+
+        deferred_for = 0
+        if deferred:
+            deferred_for = max(retry_in for retry_in, _ in deferred)
+            first = min(index for _, index in deferred)
+            checkpoint = rewind_checkpoint(campaign, checkpoint, rows_by_phone[provider_requests[first][0][0]][0])
+        # Advance the cursor only after the batch's results are committed
+        save_checkpoint(self.user_conn, self.campaign_id, checkpoint)
+        return checkpoint, deferred_for
+
+    def run(self, time_budget):
+        """
+        Send batches until the campaign finishes or stops, or until `time_budget`
+        seconds have passed. Returns totals with status "yield" in the last case.
+        """
+        deadline = time.monotonic() + time_budget
+        sent = failed = 0
+        while True:
+            result = self.send_batch()
+            sent += result.get("sent", 0)
+            failed += result.get("failed", 0)
+            if result["status"] != "ok":
+                return {**result, "sent": sent, "failed": failed, "campaign_id": self.campaign_id}
+            if time.monotonic() >= deadline:
+                return {"status": "yield", "sent": sent, "failed": failed, "campaign_id": self.campaign_id}
+
+    def close(self):
+        if self.user_conn:
+            try: self.user_conn.close()
+            except Exception: pass
+            self.user_conn = None
 
-        # Update in-memory progress
-        sms_progress[user_id] = {"sent": sent, "failed": failed}
-
-        return {"status": "ok", "sent": sent, "failed": failed}
 
+def send_user_sms_batch_runner(user_id, message=None, campaign_id=None, **kwargs):
+    """
+    Runner that performs the sending logic synchronously.
+    Called by Celery task. Requires a message argument from frontend.
+    Sends the next batch of the given campaign (a new one is created if None).
+    """
+    sender = CampaignSender(user_id, message, campaign_id)
+    try:
+        return sender.send_batch()
     except Exception as e:
         logger.exception("Fatal error in send_user_sms_batch_runner for user %s: %s", user_id, e)
         return {"status": "error", "message": str(e)}
     finally:
-        if user_conn:
-            try: user_conn.close()
-            except Exception: pass
-        if main_conn:
-            try: main_conn.close()
-            except Exception: pass
+        sender.close()
+
+
+def _sending_enabled(user_id):
+    """users.sms_sending of a tenant (False if the user is gone)."""
+    main_conn = get_main_connection()
+    try:
+        mcur = main_conn.cursor(dictionary=True)
+        mcur.execute("SELECT sms_sending FROM users WHERE id=%s", (user_id,))
+        row = mcur.fetchone()
+        mcur.close()
+    finally:
+        main_conn.close()
+    return bool(row and row.get("sms_sending"))
+
+
+def _error_backoff(errors):
+    """Delay before the next attempt after `errors` consecutive runs ended in an error."""
+    return min(config.SMS_ERROR_BACKOFF_SECONDS * 2 ** errors, config.SMS_ERROR_MAX_BACKOFF_SECONDS)
+
+
+class SenderTask(celery_app.Task):
+    """
+    Base of the campaign sender tasks. Once a sender has used up its retries
+    nothing re-enqueues the campaign, so its dispatch slot is released and
+    the campaign is marked stopped instead of being left running.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        user_id = args[0] if args else kwargs.get("user_id")
+        campaign_id = args[2] if len(args) > 2 else kwargs.get("campaign_id")
+        logger.error("Sender task %s for user %s gave up on campaign %s: %s", task_id, user_id, campaign_id, exc)
+        try:
+            release(kwargs.get("lease"))
+        except Exception as e:
+            logger.warning("Could not release the dispatch slot of task %s: %s", task_id, e)
+        if user_id is None or campaign_id is None:
+            return
+        try:
+            user_conn = get_user_connection(user_id)
+            try:
+                stop_campaign(user_conn, campaign_id)
+            finally:
+                user_conn.close()
+        except Exception as e:
+            logger.error("Could not mark campaign %s of user %s stopped: %s", campaign_id, user_id, e)
 
 
 # --- Celery task wrapper with self-reschedule ---
-@celery_app.task(bind=True, name="sms.send_user_sms_batch", autoretry_for=(Exception,),
+@celery_app.task(bind=True, base=SenderTask, name="sms.send_user_sms_batch", autoretry_for=(Exception,),
                  retry_backoff=True, retry_kwargs={"max_retries": 3})
-def send_user_sms_batch(self, user_id, message, *args, **kwargs):
+def send_user_sms_batch(self, user_id, message, campaign_id=None, errors=0, *args, lease=None, **kwargs):
+    """`errors` counts the consecutive batches that ended in an error, for the backoff."""
     logger.info("Celery task started for user %s (task_id=%s)", user_id, self.request.id)
-    result = send_user_sms_batch_runner(user_id, message)
+    result = send_user_sms_batch_runner(user_id, message, campaign_id)
+    campaign_id = result.get("campaign_id", campaign_id)
     logger.info("Celery task finished for user %s (task_id=%s): %s", user_id, self.request.id, result)
 
     # Auto-reschedule if sending is enabled
-    main_conn = get_main_connection()
-    mcur = main_conn.cursor(dictionary=True)
-    mcur.execute("SELECT sms_sending FROM users WHERE id=%s", (user_id,))
-    sending_enabled = mcur.fetchone().get("sms_sending")
-    mcur.close()
-    if sending_enabled:
-        self.apply_async((user_id, message), countdown=config.SEND_DELAY_SECONDS)
+    status = result.get("status")
+    follow_up = None
+    if status not in ("stopped", "completed", "quota_exhausted") and _sending_enabled(user_id):
+        # With the token bucket pacing every send, the next batch can start right away
+        countdown = 0 if config.SMS_RATE_LIMIT_ENABLED else config.SEND_DELAY_SECONDS
+        next_errors = 0
+        if status == "deferred":
+            countdown = result["retry_in"]
+        elif status == "error":
+            # Bad settings or a tenant DB that is down: back off instead of spinning on the main DB
+            next_errors = errors + 1
+            countdown = _error_backoff(errors)
+            logger.warning("Batch for user %s failed (%s), retrying in %.0fs",
+                           user_id, result.get("message"), countdown)
+        follow_up = ((user_id, message, campaign_id, next_errors), countdown)
+    release(lease)
+    # Last: an exception after queueing the next batch would make autoretry run this batch
+    # again and queue a second follow-up, i.e. two senders for one campaign
+    if follow_up:
+        _enqueue(self, user_id, *follow_up)
+    return result
+
+
+# --- Celery task: one task owns the campaign (SMS_SENDER_MODE=loop) ---
+@celery_app.task(bind=True, base=SenderTask, name="sms.run_user_campaign", autoretry_for=(Exception,),
+                 retry_backoff=True, retry_kwargs={"max_retries": 3})
+def run_user_campaign(self, user_id, message, campaign_id=None, errors=0, lease=None):
+    """
+    Long-lived sender: loops over the campaign's batches with one session,
+    provider config and tenant connection. After SMS_SENDER_SLICE_SECONDS it
+    re-enqueues itself from the saved checkpoint, so worker restarts and
+    deploys never lose more than the batch in flight. A slice that ended in
+    an error is resumed with the same backoff as batch mode while sending is
+    enabled (`errors` counts consecutive failed slices).
+    """
+    logger.info("Campaign sender started for user %s (task_id=%s)", user_id, self.request.id)
+    sender = CampaignSender(user_id, message, campaign_id)
+    try:
+        result = sender.run(config.SMS_SENDER_SLICE_SECONDS)
+    finally:
+        sender.close()
+    logger.info("Campaign sender finished a slice for user %s (task_id=%s): %s", user_id, self.request.id, result)
+
+    campaign_id = result.get("campaign_id", campaign_id)
+    countdown, next_errors = None, 0
+    if result["status"] in ("yield", "deferred"):
+        countdown = result.get("retry_in", 0)
+    elif result["status"] == "error":
+        if _sending_enabled(user_id):
+            next_errors = errors + 1
+            countdown = _error_backoff(errors)
+            logger.warning("Campaign %s for user %s failed (%s), resuming in %.0fs",
+                           campaign_id, user_id, result.get("message"), countdown)
+        else:
+            logger.warning("Campaign %s for user %s failed (%s) and sending is off, not resuming",
+                           campaign_id, user_id, result.get("message"))
+    release(lease)
+    # Last, so nothing that can still fail (and retry this task) runs after the follow-up is queued
+    if countdown is not None:
+        _enqueue(self, user_id, (user_id, message, campaign_id, next_errors), countdown)
+    return result
+
+
+def send_priority_messages(user_id, messages):
+    """
+    Send a few transactional messages [(phone, text), ...] right away, outside
+    any campaign: no sms_sending flag, no fair-share queue, and the priority
+    share of the rate limits. Outcomes are returned, not written to
+    sent_messages, so they never affect campaign eligibility.
+    """
+    user_info = _load_user_info(user_id)
+    if not user_info:
+        return {"status": "error", "message": "user_not_found"}
+    sms_api_url = user_info.get("sms_api_url")
+    if not is_allowed_api_url(sms_api_url):
+        logger.error("Blocked unsafe sms_api_url for user %s: %s", user_id, sms_api_url)
+        return {"status": "error", "message": "blocked_api_url"}
+
+    # Per message, by position: one request may list the same phone more than once
+    costs = [text_segments(text) if config.SMS_QUOTA_COUNT_SEGMENTS else 1 for _, text in messages]
+    reservation, granted = quota.reserve(user_id, sum(costs))
+    if granted < sum(costs):
+        quota.commit(user_id, reservation, 0)
+        return {"status": "quota_exhausted"}
+
+    provider = get_provider(sms_api_url)
+    breaker = CircuitBreaker(provider_host(sms_api_url))
+    limiter = None
+    if config.SMS_RATE_LIMIT_ENABLED:
+        limiter = sms_limiter(user_id, sms_api_url, user_info.get("sms_rate_limit"),
+                              user_info.get("sms_rate_burst"), lane="priority")
+    session = _get_session(1)
+
+    results = []   # [{"phone", "ok"}] in message order
+    try:
+        for request_messages in pack_messages(provider, messages):
+            breaker.check()
+            if limiter:
+                limiter.acquire(len(request_messages))
+            outcome = _send_request(session, provider, user_id, sms_api_url, user_info.get("sms_api_token"),
+                                    user_info.get("sms_sender_id"), request_messages, breaker)
+            results.extend({"phone": phone, "ok": bool(outcome.get(phone))} for phone, _ in request_messages)
+    except CircuitOpenError as exc:
+        logger.warning("Provider circuit open for user %s, priority send refused: %s", user_id, exc)
+        return {"status": "provider_unavailable", "retry_in": exc.retry_in, "results": results}
+    finally:
+        quota.commit(user_id, reservation, sum(cost for cost, r in zip(costs, results) if r["ok"]))
+        try:
+            quota.reconcile(user_id)
+        except Exception as exc:
+            logger.warning("Could not sync sms_used for user %s (will retry): %s", user_id, exc)
+
+    return {"status": "ok", "results": results}
+
+
+# --- Celery task: transactional sends on their own queue (see celery_app task_routes) ---
+@celery_app.task(name="sms.send_priority")
+def send_priority(user_id, messages):
+    result = send_priority_messages(user_id, [tuple(m) for m in messages])
+    result["user_id"] = int(user_id)
+    logger.info("Priority send for user %s: %s", user_id, result.get("status"))
     return result
 
 
+@celery_app.task(name="sms.scheduler_tick")
+def scheduler_tick():
+    """Re-run fair-share dispatch (covers leases that expired without a release)."""
+    return dispatch()
+
+
+def _enqueue(task, user_id, args, countdown=0):
+    """Queue a sender task behind the fair-share scheduler, or straight to Celery when it is off."""
+    if config.SMS_FAIR_SCHEDULING:
+        submit(user_id, task.name, args, countdown)
+    else:
+        task.apply_async(args, countdown=countdown)
+
+
+def start_sender(user_id, message, campaign_id):
+    """Enqueue the sender for a campaign according to SMS_SENDER_MODE."""
+    task = run_user_campaign if config.SMS_SENDER_MODE == "loop" else send_user_sms_batch
+    _enqueue(task, user_id, (user_id, message, campaign_id))
+
+
 # --- Flask route to start sending ---
 @sms_bp.route("/send", methods=["POST", "OPTIONS"])
 @jwt_required()
@@ -185,6 +578,11 @@ def send_sms_now():
     if not user_message or not user_message.strip():
         return jsonify({"message": "Please provide a message"}), 400
 
+    try:
+        MessageTemplate(user_message.strip())
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     main_conn = get_main_connection()
     mcur = main_conn.cursor()
     mcur.execute("""
@@ -192,13 +590,22 @@ def send_sms_now():
     """, (user_message.strip(), user_id))
     main_conn.commit()
     mcur.close()
+    main_conn.close()
+
+    # A new send replaces whatever campaign was running
+    user_conn = get_user_connection(user_id)
+    stop_running_campaigns(user_conn)
+    campaign_id = create_campaign(user_conn, user_message.strip())
+    start_progress(user_id, campaign_id, count_recipients(user_conn))
+    user_conn.close()
 
     # Schedule Celery task
-    send_user_sms_batch.delay(user_id, user_message.strip())
+    start_sender(user_id, user_message.strip(), campaign_id)
 
     return jsonify({
         "message": "SMS sending started",
-        "task_id": "scheduled"
+        "task_id": "scheduled",
+        "campaign_id": campaign_id
     }), 202
 
 
@@ -211,6 +618,66 @@ def send_sms_now():
     }), 202
 
 
+PRIORITY_OWNER_TTL = 24 * 3600   # as long as Celery keeps results (result_expires default)
+
+
+def _priority_owner_key(task_id):
+    return f"priority:owner:{task_id}"
+
+
+# --- Transactional sends: {"messages": [{"phone", "message"}, ...]} or one {"phone", "message"} ---
+@sms_bp.route("/priority", methods=["POST"])
+@jwt_required()
+def send_priority_now():
+    user_id = get_jwt_identity()
+    req_data = request.get_json() or {}
+    items = req_data.get("messages")
+    if items is None:
+        items = [req_data]
+    if not isinstance(items, list) or not items:
+        return jsonify({"message": "Please provide messages"}), 400
+    if len(items) > config.SMS_PRIORITY_MAX_MESSAGES:
+        return jsonify({"message": f"At most {config.SMS_PRIORITY_MAX_MESSAGES} messages per request"}), 400
+
+    messages = []
+    for item in items:
+        phone = str((item or {}).get("phone") or "").strip()
+        text = str((item or {}).get("message") or "").strip()
+        if not phone or not text:
+            return jsonify({"message": "Each message needs a phone and a message"}), 400
+        messages.append((phone, text))
+
+    # The owner is recorded before the task exists, so every state of it (failures included) can be checked
+    task_id = str(uuid.uuid4())
+    try:
+        get_redis().set(_priority_owner_key(task_id), user_id, ex=PRIORITY_OWNER_TTL)
+    except RedisError as exc:
+        logger.error("Cannot record owner of priority task for user %s: %s", user_id, exc)
+        return jsonify({"message": "Priority sending unavailable, please try again"}), 503
+    task = send_priority.apply_async((user_id, messages), task_id=task_id, priority=9)
+    if req_data.get("wait"):
+        try:
+            return jsonify(task.get(timeout=config.SMS_PRIORITY_WAIT_SECONDS)), 200
+        except Exception:
+            pass   # still queued or running: the caller can poll the task
+    return jsonify({"message": "SMS queued", "task_id": task.id}), 202
+
+
+@sms_bp.route("/priority/<task_id>", methods=["GET"])
+@jwt_required()
+def priority_status(task_id):
+    user_id = get_jwt_identity()
+    if get_redis().get(_priority_owner_key(task_id)) != str(user_id):
+        return jsonify({"message": "Task not found"}), 404
+    task = send_priority.AsyncResult(task_id)
+    if not task.ready():
+        return jsonify({"status": "pending", "task_id": task_id}), 200
+    result = task.result if task.successful() else {"status": "error", "message": "task_failed"}
+    if not isinstance(result, dict):
+        result = {"status": "error", "message": "task_failed"}
+    return jsonify(result), 200
+
+
 # --- Flask route to stop sending ---
 @sms_bp.route("/stop", methods=["POST"])
 @jwt_required()
@@ -221,21 +688,66 @@ def stop_sms():
     mcur.execute("UPDATE users SET sms_sending = FALSE WHERE id=%s", (user_id,))
     main_conn.commit()
     mcur.close()
+    main_conn.close()
+
+    user_conn = get_user_connection(user_id)
+    stop_running_campaigns(user_conn)
+    user_conn.close()
 
-    # Reset progress
-    if user_id in sms_progress:
-        sms_progress[user_id] = {"sent": 0, "failed": 0}
+    clear_progress(user_id)
+    try:
+        quota.reconcile(user_id, force=True)
+    except Exception as exc:
+        logger.warning("Could not sync sms_used for user %s: %s", user_id, exc)
 
     return jsonify({"message": "SMS sending stopped"}), 200
 
 
-# --- Optional: progress route for frontend polling ---
+# --- Progress route for frontend polling (?campaign_id= for a specific campaign) ---
 @sms_bp.route("/progress", methods=["GET"])
 @jwt_required()
 def sms_progress_route():
     user_id = get_jwt_identity()
-    progress = sms_progress.get(user_id, {"sent": 0, "failed": 0})
-    return jsonify(progress)
+    campaign_id = request.args.get("campaign_id", type=int)
+    return jsonify(get_progress(user_id, campaign_id))
+
+
+# --- Server-Sent Events progress stream (EventSource can pass the token as ?jwt=) ---
+@sms_bp.route("/progress/stream", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"])
+def sms_progress_stream():
+    user_id = get_jwt_identity()
+    campaign_id = request.args.get("campaign_id", type=int)
+
+    def generate():
+        last = None
+        # The stream occupies a web worker (a sync worker can serve nothing else meanwhile), so it
+        # ends after SMS_PROGRESS_STREAM_SECONDS, well within the worker timeout; `retry:` tells
+        # EventSource when to reconnect for the next stretch
+        yield f"retry: {config.SMS_PROGRESS_STREAM_RETRY_MS}\n\n"
+        deadline = time.monotonic() + config.SMS_PROGRESS_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            payload = json.dumps(get_progress(user_id, campaign_id))
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            else:
+                yield ": keep-alive\n\n"
+            time.sleep(config.SMS_PROGRESS_STREAM_INTERVAL)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- Scheduler queue depth: admins see every tenant, users their own ---
+@sms_bp.route("/queues", methods=["GET"])
+@jwt_required()
+def sms_queues():
+    user_id = get_jwt_identity()
+    stats = queue_stats()
+    if not is_admin(user_id):
+        stats = {user_id: stats.get(str(user_id), {"queued": 0, "delayed": 0, "running": 0, "cap": tenant_cap(user_id)})}
+    return jsonify(stats)
 
 
 @sms_bp.route("/last_message", methods=["GET"])
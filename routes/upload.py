@@ -3,44 +3,28 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import pandas as pd
 import os
-from db import get_user_connection
+import time
+import uuid
+from celery_app import celery_app
+from config import config
+from db import get_main_connection
+from utils.importer import import_contacts, iter_chunks
 
 upload_bp = Blueprint("upload", __name__)
 
-UPLOAD_FOLDER = "uploads"
 ALLOWED_EXTENSIONS = {"csv", "xlsx"}
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def normalize_phone(phone):
-    """Robust normalization for Egyptian phone numbers."""
-    phone = str(phone).strip().replace(" ", "")
-    phone = phone.replace("+", "")
-    phone = ''.join(filter(str.isdigit, phone))  # keep digits only
-
-    # Handle local formats like 010..., 106..., etc.
-    if phone.startswith("0"):
-        phone = "2" + phone       # 01061463163 -> 201061463163
-    elif phone.startswith("1") and len(phone) == 10:
-        phone = "20" + phone      # 1061463163 -> 201061463163
-
-    # Ensure starts with 20
-    if not phone.startswith("20"):
-        return None
-
-    return phone
-
 @upload_bp.route("/contacts", methods=["POST"])
 @jwt_required()
 def upload_contacts():
     """
-    Upload CSV or Excel file containing columns: phone, name(optional)
+    Upload CSV or Excel file containing columns: phone, name(optional).
+    The file is spooled and imported by a background job; poll status_url.
     """
     user_id = get_jwt_identity()
 
@@ -55,68 +39,156 @@ def upload_contacts():
     if not allowed_file(file.filename):
         return jsonify({"error": "Invalid file type"}), 400
 
+    job_id = str(uuid.uuid4())
     filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    # Stored relative to UPLOAD_FOLDER (shared with the import workers), which may be mounted elsewhere there
+    spool_name = f"{job_id}_{filename}"
+    filepath = _spool_path(spool_name)
     file.save(filepath)
 
-    # --- Parse file ---
+    # Reject unreadable files and files without a phone column right away
     try:
-        if filename.endswith(".csv"):
-            df = pd.read_csv(filepath)
-        else:
-            df = pd.read_excel(filepath)
+        next(iter_chunks(filepath, 1), None)
+    except ValueError as e:
+        os.remove(filepath)
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        os.remove(filepath)
         return jsonify({"error": f"Failed to read file: {str(e)}"}), 400
 
-    # ✅ Normalize column names
-    df.columns = df.columns.str.strip().str.lower()
+    conn = get_main_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO import_jobs (id, user_id, filename, path) VALUES (%s, %s, %s, %s)
+    """, (job_id, user_id, filename, spool_name))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    try:
+        run_contact_import.delay(job_id)
+    except Exception as e:
+        _finish_job(job_id, spool_name, error=f"Could not queue the import: {str(e)}")
+        return jsonify({"error": "Import queue unavailable, please try again"}), 503
+
+    return jsonify({
+        "message": "Contacts upload queued",
+        "job_id": job_id,
+        "status_url": f"/api/upload/jobs/{job_id}"
+    }), 202
+
+
+def _job_view(job):
+    elapsed = job["elapsed_seconds"] or 0
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "rows_read": job["rows_read"],
+        "inserted": job["inserted"],
+        "skipped": job["skipped"],
+        "total": job["total"],
+        "rows_per_second": round(job["rows_read"] / elapsed, 1) if elapsed else None,
+        "error": job["error"],
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+    }
+
+
+@upload_bp.route("/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def import_job_status(job_id):
+    user_id = get_jwt_identity()
+    conn = get_main_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT * FROM import_jobs WHERE id=%s AND user_id=%s", (job_id, user_id))
+    job = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not job:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(_job_view(job)), 200
+
+
+@upload_bp.route("/jobs", methods=["GET"])
+@jwt_required()
+def list_import_jobs():
+    user_id = get_jwt_identity()
+    conn = get_main_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT * FROM import_jobs WHERE user_id=%s ORDER BY created_at DESC LIMIT 20", (user_id,))
+    jobs = cur.fetchall()
+    cur.close()
+    conn.close()
+    return jsonify([_job_view(job) for job in jobs]), 200
+
 
-    if "phone" not in df.columns:
-        return jsonify({"error": "Missing 'phone' column"}), 400
+def _spool_path(path):
+    """Absolute path of a spooled upload (rows of older versions hold absolute paths already)."""
+    return os.path.join(config.UPLOAD_FOLDER, path)
 
-    # Normalize data
-    df["phone"] = df["phone"].astype(str).str.strip()
-    if "name" not in df.columns:
-        df["name"] = None
 
-    # ✅ Apply normalization and drop duplicates
-    df["phone"] = df["phone"].apply(normalize_phone)
-    df = df[df["phone"].notna()].drop_duplicates(subset=["phone"])
+def _update_job(job_id, **fields):
+    conn = get_main_connection()
+    cur = conn.cursor()
+    cur.execute(f"UPDATE import_jobs SET {', '.join(f'{name}=%s' for name in fields)} WHERE id=%s",
+                (*fields.values(), job_id))
+    conn.commit()
+    cur.close()
+    conn.close()
 
-    if df.empty:
-        return jsonify({"error": "No valid phone numbers found"}), 400
 
-    # --- Insert into user-specific DB ---
+def _finish_job(job_id, path, error=None):
+    _update_job(job_id, status="failed" if error else "completed", error=error and error[:1000])
     try:
-        conn = get_user_connection(user_id)
-        cursor = conn.cursor()
-
-        inserted, skipped = 0, 0
-        for _, row in df.iterrows():
-            try:
-                cursor.execute(
-                    """
-                    INSERT IGNORE INTO customers (phone, name)
-                    VALUES (%s, %s)
-                    """,
-                    (row["phone"], row["name"]),
-                )
-                if cursor.rowcount:
-                    inserted += 1
-                else:
-                    skipped += 1
-            except Exception:
-                skipped += 1
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        os.remove(_spool_path(path))
+    except OSError:
+        pass
+
+
+# --- Celery task: import a spooled file, resumable from import_jobs.next_row ---
+@celery_app.task(bind=True, name="imports.run_contact_import", autoretry_for=(Exception,),
+                 retry_backoff=True, retry_kwargs={"max_retries": 5})
+def run_contact_import(self, job_id):
+    """
+    Rows are committed chunk by chunk and next_row is saved after each
+    commit, so a redelivered or retried task continues from there. A chunk
+    committed just before a crash is replayed; INSERT IGNORE then counts its
+    rows as skipped.
+    """
+    conn = get_main_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT * FROM import_jobs WHERE id=%s", (job_id,))
+    job = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not job or job["status"] in ("completed", "failed"):
+        return {"status": "skipped"}
+    path = _spool_path(job["path"])
+    if not os.path.exists(path):
+        _finish_job(job_id, job["path"], error="Uploaded file not found on the import worker; "
+                                               "UPLOAD_FOLDER must be storage shared with the web app")
+        return {"status": "failed"}
+
+    base_inserted, base_skipped = job["inserted"], job["skipped"]
+    base_elapsed = job["elapsed_seconds"] or 0
+    started = time.monotonic()
+    _update_job(job_id, status="running")
+
+    def checkpoint(stats, next_row):
+        _update_job(job_id, next_row=next_row, rows_read=stats.read, total=stats.total,
+                    inserted=base_inserted + stats.inserted, skipped=base_skipped + stats.skipped,
+                    elapsed_seconds=base_elapsed + time.monotonic() - started)
+
+    try:
+        stats = import_contacts(job["user_id"], path, start_row=job["next_row"], on_chunk=checkpoint)
+    except (ValueError, OSError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        # The file itself is the problem: retrying cannot help
+        _finish_job(job_id, job["path"], error=str(e))
+        return {"status": "failed"}
     except Exception as e:
-        return jsonify({"error": f"Database error: {str(e)}"}), 500
+        if self.request.retries >= self.max_retries:
+            _finish_job(job_id, job["path"], error=f"Database error: {str(e)}")
+        raise
 
-    return jsonify({
-        "message": "Contacts uploaded successfully",
-        "inserted": inserted,
-        "skipped": skipped,
-        "total": len(df)
-    })
+    _finish_job(job_id, job["path"], error=None if stats.total else "No valid phone numbers found")
+    return {"status": "completed", **stats.as_dict()}
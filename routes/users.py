@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash
-from db import get_main_connection
+from db import get_main_connection, get_main_read_connection, invalidate_tenant
+from utils import quota
 
 users_bp = Blueprint("users", __name__)
 
@@ -23,7 +24,7 @@ def list_users():
     if not is_admin(admin_id):
         return jsonify({"error": "Unauthorized"}), 403
 
-    conn = get_main_connection()
+    conn = get_main_read_connection(admin_id)
     cur = conn.cursor(dictionary=True)
     cur.execute("""
         SELECT id, username, email, sms_quota, sms_used, is_admin, suspended,company_type, created_at
@@ -71,7 +72,8 @@ def update_user(user_id):
     values = []
 
     # ✅ Added "company_type" here
-    allowed_fields = ["email", "sms_quota", "is_admin", "company_type"]
+    allowed_fields = ["email", "sms_quota", "is_admin", "company_type",
+                      "sms_rate_limit", "sms_rate_burst"]
 
     for field in allowed_fields:
         if field in data:
@@ -90,6 +92,12 @@ def update_user(user_id):
     cur.close()
     conn.close()
 
+    invalidate_tenant(user_id)
+
+    # Running senders reserve against the Redis quota ledger, keep its limit in step
+    if "sms_quota" in data:
+        quota.set_limit(user_id, data["sms_quota"])
+
     return jsonify({"message": "✅ User updated successfully"}), 200
 
 
@@ -130,6 +138,7 @@ def delete_user(user_id):
     conn.commit()
     cur.close()
     conn.close()
+    invalidate_tenant(user_id, drop_pool=True)
 
     return jsonify({"message": "✅ User deleted successfully"}), 200
 
@@ -154,6 +163,7 @@ def suspend_user(user_id):
     conn.commit()
     cur.close()
     conn.close()
+    invalidate_tenant(user_id)
 
     status = "suspended" if suspended else "unsuspended"
     return jsonify({"message": f"✅ User {status} successfully"}), 200
@@ -25,7 +25,11 @@ REM Step 5: Start Celery worker
 echo ------------------------------------------
 echo Starting Celery worker...
 echo ------------------------------------------
-celery -A celery_app.celery_app worker --loglevel=info
+REM Transactional sends get a dedicated worker so they never wait behind a campaign
+start "Celery priority worker" celery -A celery_app.celery_app worker -Q sms_priority -n priority@%%h --loglevel=info
+REM Contact imports run for minutes on big files: keep them off the bulk worker
+start "Celery import worker" celery -A celery_app.celery_app worker -Q imports -n imports@%%h --loglevel=info
+celery -A celery_app.celery_app worker -Q sms_bulk,celery --loglevel=info
 
 REM Step 6: Keep window open after worker stops
 pause
@@ -0,0 +1,22 @@
+"""
+Test setup: db.py opens the main MySQL pool at import time, so tests run
+against a stand-in module that exposes the same names. Tests that need a
+database call patch these functions themselves.
+"""
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _unavailable(*args, **kwargs):
+    raise RuntimeError("no database in tests: patch the db function you need")
+
+
+_db = types.ModuleType("db")
+for _name in ("get_main_connection", "get_main_read_connection", "get_user_connection",
+              "get_user_read_connection", "get_db_connection", "get_tenant_info", "invalidate_tenant"):
+    setattr(_db, _name, _unavailable)
+_db.tenant_pools = _db.server_pools = None
+sys.modules.setdefault("db", _db)
@@ -0,0 +1,74 @@
+import logging
+
+import mysql.connector
+import pytest
+
+from config import config
+from utils import replicas
+
+
+class FakeCursor:
+    def __init__(self, status):
+        self.status = status
+
+    def execute(self, sql):
+        if isinstance(self.status, Exception):
+            raise self.status
+
+    def fetchone(self):
+        return self.status
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, status):
+        self.status = status
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.status)
+
+    def close(self):
+        pass
+
+
+class Probes(list):
+    """Connection params of every lag probe; `status` is what SHOW REPLICA STATUS returns (or raises)."""
+    status = None
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    probes = Probes()
+    monkeypatch.setattr(replicas, "_health", {})
+    monkeypatch.setattr(replicas, "recently_wrote", lambda user_id: False)
+
+    def connect(**params):
+        probes.append(params)
+        return FakeConnection(probes.status)
+
+    monkeypatch.setattr(mysql.connector, "connect", connect)
+    return probes
+
+
+def test_replica_is_skipped_when_the_monitor_account_lacks_replication_client(probes, caplog):
+    probes.status = mysql.connector.ProgrammingError(
+        msg="Access denied; you need (at least one of) the REPLICATION CLIENT privilege(s)", errno=1227)
+
+    with caplog.at_level(logging.ERROR, logger=replicas.__name__):
+        assert replicas.pick_replica(["replica-1"], user_id=5) is None
+    assert "REPLICATION CLIENT" in caplog.text
+    assert [p["user"] for p in probes] == [config.REPLICA_MONITOR_USER]
+
+    # Cached per host: the next lookup within REPLICA_LAG_CHECK_SECONDS does not probe again
+    assert replicas.is_healthy("replica-1") is False
+    assert len(probes) == 1
+
+
+def test_replica_within_lag_is_used_and_probed_with_the_monitor_account(probes):
+    probes.status = {"Seconds_Behind_Source": 0}
+
+    assert replicas.pick_replica(["replica-1"], user_id=5) == "replica-1"
+    assert probes[0]["user"] == config.REPLICA_MONITOR_USER
+    assert probes[0]["password"] == config.REPLICA_MONITOR_PASSWORD
@@ -0,0 +1,81 @@
+import pytest
+
+from config import config
+from routes import sms
+
+
+class FakeSender:
+    result = None
+
+    def __init__(self, user_id, message, campaign_id=None):
+        self.campaign_id = campaign_id
+
+    def run(self, time_budget):
+        return dict(self.result)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sms, "CampaignSender", FakeSender)
+    monkeypatch.setattr(sms, "release", lambda lease: calls.append(("release", lease)))
+    monkeypatch.setattr(sms, "_enqueue", lambda task, user_id, args, countdown=0:
+                        calls.append(("enqueue", args, countdown)))
+    return calls
+
+
+def test_loop_sender_resumes_after_an_error_with_backoff(calls, monkeypatch):
+    FakeSender.result = {"status": "error", "message": "db down", "campaign_id": 7}
+    monkeypatch.setattr(sms, "_sending_enabled", lambda user_id: True)
+
+    sms.run_user_campaign(5, "hello", 7, errors=2, lease="5:1")
+
+    assert calls == [("release", "5:1"),
+                     ("enqueue", (5, "hello", 7, 3), sms._error_backoff(2))]
+    assert sms._error_backoff(2) == min(config.SMS_ERROR_BACKOFF_SECONDS * 4, config.SMS_ERROR_MAX_BACKOFF_SECONDS)
+
+
+def test_loop_sender_error_is_not_resumed_once_sending_is_off(calls, monkeypatch):
+    FakeSender.result = {"status": "error", "message": "user_not_found", "campaign_id": 7}
+    monkeypatch.setattr(sms, "_sending_enabled", lambda user_id: False)
+
+    sms.run_user_campaign(5, "hello", 7, lease="5:1")
+
+    assert calls == [("release", "5:1")]
+
+
+def test_loop_sender_yield_resets_the_error_count(calls, monkeypatch):
+    FakeSender.result = {"status": "yield", "campaign_id": 7}
+    monkeypatch.setattr(sms, "_sending_enabled", lambda user_id: pytest.fail("not needed for a yield"))
+
+    sms.run_user_campaign(5, "hello", 7, errors=4, lease="5:1")
+
+    assert calls == [("release", "5:1"), ("enqueue", (5, "hello", 7, 0), 0)]
+
+
+def test_batch_sender_queues_the_next_batch_after_releasing_its_lease(calls, monkeypatch):
+    monkeypatch.setattr(sms, "send_user_sms_batch_runner",
+                        lambda user_id, message, campaign_id: {"status": "ok", "campaign_id": 7})
+    monkeypatch.setattr(sms, "_sending_enabled", lambda user_id: True)
+    monkeypatch.setattr(config, "SMS_RATE_LIMIT_ENABLED", True)
+
+    sms.send_user_sms_batch(5, "hello", 7, lease="5:1")
+
+    assert calls == [("release", "5:1"), ("enqueue", (5, "hello", 7, 0), 0)]
+
+
+def test_batch_sender_does_not_queue_a_follow_up_when_releasing_fails(calls, monkeypatch):
+    monkeypatch.setattr(sms, "send_user_sms_batch_runner",
+                        lambda user_id, message, campaign_id: {"status": "ok", "campaign_id": 7})
+    monkeypatch.setattr(sms, "_sending_enabled", lambda user_id: True)
+
+    def release(lease):
+        raise RuntimeError("redis down")
+    monkeypatch.setattr(sms, "release", release)
+
+    with pytest.raises(RuntimeError):
+        sms.send_user_sms_batch.run(5, "hello", 7, lease="5:1")
+    assert calls == []
@@ -0,0 +1,147 @@
+# backend/utils/campaigns.py
+"""
+Campaign-scoped recipient selection for the SMS sender.
+
+A campaign walks `customers` once in primary-key order (keyset cursor in
+campaigns.last_customer_id), then makes retry passes over failed rows in
+sent_messages (keyset cursor in campaigns.retry_cursor) until no retryable
+row is left. Every batch is an index range read instead of a full
+customers/sent_messages anti-join.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+
+
+def create_campaign(conn, message):
+    cur = conn.cursor()
+    cur.execute("INSERT INTO campaigns (message, status) VALUES (%s, 'running')", (message,))
+    campaign_id = cur.lastrowid
+    conn.commit()
+    cur.close()
+    return campaign_id
+
+
+def get_campaign(conn, campaign_id):
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT id, message, status, phase, last_customer_id, retry_cursor
+        FROM campaigns WHERE id = %s
+    """, (campaign_id,))
+    campaign = cur.fetchone()
+    cur.close()
+    return campaign
+
+
+def count_recipients(conn):
+    """Recipients a new campaign will try (one full scan, run once per campaign)."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*)
+        FROM customers c
+        LEFT JOIN sent_messages s ON s.phone = c.phone
+        WHERE s.phone IS NULL OR (s.status = 'failed' AND s.retries < %s)
+    """, (MAX_RETRIES,))
+    total = cur.fetchone()[0]
+    cur.close()
+    return int(total or 0)
+
+
+def stop_campaign(conn, campaign_id):
+    cur = conn.cursor()
+    cur.execute("UPDATE campaigns SET status = 'stopped' WHERE id = %s AND status = 'running'", (campaign_id,))
+    conn.commit()
+    cur.close()
+
+
+def stop_running_campaigns(conn):
+    cur = conn.cursor()
+    cur.execute("UPDATE campaigns SET status = 'stopped' WHERE status = 'running'")
+    conn.commit()
+    cur.close()
+
+
+def _eligible(row):
+    status = row.get("status")
+    return status is None or (status == "failed" and int(row.get("retries") or 0) < MAX_RETRIES)
+
+
+def next_batch(conn, campaign, limit):
+    """
+    Read the next `limit` candidate recipients for a campaign.
+
+    Returns (recipients, checkpoint): recipients are dicts with phone, name,
+    retries and status; checkpoint is the cursor state to persist with
+    save_checkpoint() once their results are committed.
+    """
+    cur = conn.cursor(dictionary=True)
+    checkpoint = {
+        "phase": campaign["phase"],
+        "last_customer_id": int(campaign["last_customer_id"] or 0),
+        "retry_cursor": int(campaign["retry_cursor"] or 0),
+        "status": campaign["status"],
+    }
+    try:
+        if checkpoint["phase"] == "initial":
+            cur.execute("""
+                SELECT c.id, c.phone, c.name, COALESCE(s.retries, 0) AS retries, s.status
+                FROM customers c
+                LEFT JOIN sent_messages s ON s.phone = c.phone
+                WHERE c.id > %s
+                ORDER BY c.id
+                LIMIT %s
+            """, (checkpoint["last_customer_id"], limit))
+            rows = cur.fetchall()
+            if rows:
+                checkpoint["last_customer_id"] = rows[-1]["id"]
+            if len(rows) < limit:
+                checkpoint["phase"] = "retry"
+                checkpoint["retry_cursor"] = 0
+            return [r for r in rows if _eligible(r)], checkpoint
+
+        cur.execute("""
+            SELECT s.id, s.phone, c.name, s.retries, s.status
+            FROM sent_messages s
+            JOIN customers c ON c.phone = s.phone
+            WHERE s.status = 'failed' AND s.retries < %s AND s.id > %s
+            ORDER BY s.id
+            LIMIT %s
+        """, (MAX_RETRIES, checkpoint["retry_cursor"], limit))
+        rows = cur.fetchall()
+        if not rows and checkpoint["retry_cursor"] == 0:
+            checkpoint["status"] = "completed"
+        elif len(rows) < limit:
+            checkpoint["retry_cursor"] = 0     # end of this pass, start the next one
+        else:
+            checkpoint["retry_cursor"] = rows[-1]["id"]
+        return rows, checkpoint
+    finally:
+        cur.close()
+
+
+def rewind_checkpoint(campaign, checkpoint, row):
+    """
+    Checkpoint that re-reads the batch from `row` on (used when sends were
+    deferred). Rows after it that were already recorded as sent are skipped
+    on the re-read; recorded failures simply get their retry.
+    """
+    checkpoint = dict(checkpoint, phase=campaign["phase"], status="running")
+    if campaign["phase"] == "initial":
+        checkpoint["last_customer_id"] = row["id"] - 1
+    else:
+        checkpoint["retry_cursor"] = row["id"] - 1
+    return checkpoint
+
+
+def save_checkpoint(conn, campaign_id, checkpoint):
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE campaigns
+        SET phase = %s, last_customer_id = %s, retry_cursor = %s, status = %s
+        WHERE id = %s AND status = 'running'
+    """, (checkpoint["phase"], checkpoint["last_customer_id"], checkpoint["retry_cursor"],
+          checkpoint["status"], campaign_id))
+    conn.commit()
+    cur.close()
@@ -0,0 +1,130 @@
+# backend/utils/circuit_breaker.py
+"""
+Per-provider circuit breaker shared by all workers through Redis.
+
+closed    -> requests flow; consecutive failures are counted
+open      -> requests are refused until the cool-down (or the provider's
+             Retry-After) has passed; callers defer instead of failing
+half-open -> one probe request is let through; success closes the circuit,
+             failure re-opens it with a doubled cool-down
+
+Failures reported while the circuit is already open (requests that were in
+flight when it opened) are only counted; they do not re-open it.
+"""
+import logging
+
+import redis
+
+from config import config
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: state hash, probe lock
+# ARGV: op ('allow' | 'success' | 'failure'), threshold, base cool-down, max cool-down, retry_after
+# Returns seconds to wait before sending ("0" = go ahead) for 'allow', the
+# opened cool-down for 'failure' ("0" if still closed).
+_BREAKER_LUA = """
+local key = KEYS[1]
+local probe = KEYS[2]
+local op = ARGV[1]
+local threshold = tonumber(ARGV[2])
+local base = tonumber(ARGV[3])
+local max_cooldown = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HGET', key, 'state') or 'closed'
+
+if op == 'allow' then
+    if state == 'closed' then
+        return '0'
+    end
+    local opened_until = tonumber(redis.call('HGET', key, 'opened_until') or 0)
+    if now < opened_until then
+        return tostring(opened_until - now)
+    end
+    if redis.call('SET', probe, '1', 'NX', 'EX', math.ceil(base)) then
+        redis.call('HSET', key, 'state', 'half_open')
+        return '0'
+    end
+    return '1'
+end
+
+if op == 'success' then
+    if state ~= 'closed' or (redis.call('HGET', key, 'failures') or '0') ~= '0' then
+        redis.call('HSET', key, 'state', 'closed', 'failures', 0, 'cooldown', base)
+        redis.call('DEL', probe)
+    end
+    return '0'
+end
+
+local retry_after = tonumber(ARGV[5])
+local failures = redis.call('HINCRBY', key, 'failures', 1)
+if state == 'open' then
+    -- Requests already in flight when the circuit opened: record them, keep the cool-down as is
+    -- (a provider's Retry-After may only push the reopening further out)
+    if retry_after > 0 then
+        local opened_until = tonumber(redis.call('HGET', key, 'opened_until') or 0)
+        if now + retry_after > opened_until then
+            redis.call('HSET', key, 'opened_until', tostring(now + retry_after))
+        end
+    end
+    return '0'
+end
+if state == 'half_open' or failures >= threshold or retry_after > 0 then
+    local cooldown = tonumber(redis.call('HGET', key, 'cooldown') or base)
+    local wait = math.max(cooldown, retry_after)
+    redis.call('HSET', key, 'state', 'open', 'opened_until', tostring(now + wait),
+               'cooldown', math.min(cooldown * 2, max_cooldown), 'failures', 0)
+    redis.call('DEL', probe)
+    redis.call('EXPIRE', key, math.ceil(wait + max_cooldown))
+    return tostring(wait)
+end
+return '0'
+"""
+
+_script = None
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending while a provider's circuit is open."""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"circuit open for {host}, retry in {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, host):
+        self.host = host
+        self.keys = [f"cb:{host}", f"cb:{host}:probe"]
+
+    def _call(self, op, retry_after=0):
+        global _script
+        try:
+            client = get_redis()
+            if _script is None:
+                _script = client.register_script(_BREAKER_LUA)
+            return float(_script(keys=self.keys, args=[
+                op, config.SMS_BREAKER_FAILURE_THRESHOLD, config.SMS_BREAKER_COOLDOWN_SECONDS,
+                config.SMS_BREAKER_MAX_COOLDOWN_SECONDS, retry_after or 0,
+            ], client=client))
+        except redis.RedisError as exc:
+            # Without Redis the breaker stays out of the way rather than blocking all sends
+            logger.warning("Circuit breaker unavailable for %s: %s", self.host, exc)
+            return 0.0
+
+    def check(self):
+        """Raise CircuitOpenError if requests to this provider must wait."""
+        wait = self._call("allow")
+        if wait > 0:
+            raise CircuitOpenError(self.host, wait)
+
+    def success(self):
+        self._call("success")
+
+    def failure(self, retry_after=None):
+        opened_for = self._call("failure", retry_after)
+        if opened_for > 0:
+            logger.warning("Circuit opened for %s for %.1fs", self.host, opened_for)
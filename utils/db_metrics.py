@@ -0,0 +1,240 @@
+# backend/utils/db_metrics.py
+"""
+Per-statement instrumentation for connections handed out by db.py.
+
+instrument() wraps a connection so that every cursor.execute/executemany is
+timed and attributed to its pool, tenant and caller (Flask endpoint or
+Celery task). Statements slower than DB_SLOW_QUERY_MS are logged with their
+normalized SQL. Counters are aggregated per (caller, normalized SQL) in the
+process and merged into Redis every DB_METRICS_FLUSH_SECONDS, so stats()
+covers all web and worker processes.
+"""
+import functools
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from celery import current_task
+from flask import has_request_context, request
+
+from config import config
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "dbstats:queries"   # "<id>:<field>" -> counter
+SQL_KEY = "dbstats:sql"         # "<id>" -> "<caller>\t<normalized sql>"
+
+# HSET the field only if the new value is larger (per-statement max latency)
+_MAX_LUA = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then redis.call('HSET', KEYS[1], ARGV[1], ARGV[2]) end
+"""
+_max_script = None
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+# CASE <col> WHEN ? THEN ? WHEN ? THEN ? ... of bulk UPDATEs (one pair per row)
+_CASE_RE = re.compile(r"\bWHEN\s+\?\s+THEN\s+\?(?:\s+WHEN\s+\?\s+THEN\s+\?)*", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_pending = {}        # (caller, sql) -> [count, total_us, rows, errors, max_us]
+_flushed_at = time.monotonic()
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """SQL with literals and parameters replaced by ?, value lists and WHEN ? THEN ? runs folded."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(...)", sql)
+    sql = _CASE_RE.sub("WHEN ? THEN ? ...", sql)
+    return _SPACE_RE.sub(" ", sql).strip()[:500]
+
+
+def _caller():
+    """Flask endpoint or Celery task the statement runs for."""
+    if has_request_context():
+        return request.endpoint or request.path
+    if current_task and current_task.name:
+        return current_task.name
+    return "-"
+
+
+def _stat_id(caller, sql):
+    return hashlib.sha1(f"{caller}\t{sql}".encode()).hexdigest()[:16]
+
+
+def _record(context, operation, elapsed, rows, error):
+    """Account one statement; returns its (caller, sql) key."""
+    pool, tenant = context
+    sql = normalize_sql(operation)
+    caller = _caller()
+    elapsed_us = int(elapsed * 1_000_000)
+    if elapsed * 1000 >= config.DB_SLOW_QUERY_MS:
+        logger.warning("Slow query %.1fms pool=%s tenant=%s caller=%s rows=%s sql=%s",
+                       elapsed * 1000, pool, tenant, caller, rows, sql)
+
+    with _lock:
+        entry = _pending.get((caller, sql))
+        if entry is None:
+            if len(_pending) >= config.DB_METRICS_MAX_STATEMENTS:
+                entry = _pending.setdefault(("-", "(other)"), [0, 0, 0, 0, 0])
+            else:
+                entry = _pending[(caller, sql)] = [0, 0, 0, 0, 0]
+        entry[0] += 1
+        entry[1] += elapsed_us
+        entry[2] += max(rows, 0)
+        entry[3] += 1 if error else 0
+        entry[4] = max(entry[4], elapsed_us)
+    _maybe_flush()
+    return caller, sql
+
+
+def _add_rows(key, rows):
+    """Rows of a SELECT become known only once they are fetched."""
+    with _lock:
+        entry = _pending.get(key)
+        if entry is not None:
+            entry[2] += rows
+
+
+def _maybe_flush(force=False):
+    global _pending, _flushed_at, _max_script
+    now = time.monotonic()
+    if not force and now - _flushed_at < config.DB_METRICS_FLUSH_SECONDS:
+        return
+    with _lock:
+        if not force and now - _flushed_at < config.DB_METRICS_FLUSH_SECONDS:
+            return
+        pending, _pending, _flushed_at = _pending, {}, now
+    if not pending:
+        return
+    try:
+        client = get_redis()
+        if _max_script is None:
+            _max_script = client.register_script(_MAX_LUA)
+        pipe = client.pipeline(transaction=False)
+        for (caller, sql), (count, total_us, rows, errors, max_us) in pending.items():
+            sid = _stat_id(caller, sql)
+            pipe.hset(SQL_KEY, sid, f"{caller}\t{sql}")
+            pipe.hincrby(STATS_KEY, f"{sid}:count", count)
+            pipe.hincrby(STATS_KEY, f"{sid}:us", total_us)
+            pipe.hincrby(STATS_KEY, f"{sid}:rows", rows)
+            if errors:
+                pipe.hincrby(STATS_KEY, f"{sid}:errors", errors)
+            _max_script(keys=[STATS_KEY], args=[f"{sid}:max_us", max_us], client=pipe)
+        pipe.execute()
+    except Exception as exc:
+        logger.debug("Could not flush DB metrics: %s", exc)
+
+
+def stats(limit=50, order_by="total_ms"):
+    """Aggregated statements across processes, heaviest first."""
+    _maybe_flush(force=True)
+    client = get_redis()
+    counters = client.hgetall(STATS_KEY)
+    sqls = client.hgetall(SQL_KEY)
+    rows = []
+    for sid, text in sqls.items():
+        caller, _, sql = text.partition("\t")
+        count = int(counters.get(f"{sid}:count") or 0)
+        if not count:
+            continue
+        total_ms = int(counters.get(f"{sid}:us") or 0) / 1000.0
+        rows.append({
+            "caller": caller,
+            "sql": sql,
+            "count": count,
+            "total_ms": round(total_ms, 1),
+            "avg_ms": round(total_ms / count, 2),
+            "max_ms": round(int(counters.get(f"{sid}:max_us") or 0) / 1000.0, 1),
+            "rows": int(counters.get(f"{sid}:rows") or 0),
+            "errors": int(counters.get(f"{sid}:errors") or 0),
+        })
+    rows.sort(key=lambda r: r.get(order_by, 0), reverse=True)
+    return rows[:limit]
+
+
+def reset():
+    with _lock:
+        _pending.clear()
+    get_redis().delete(STATS_KEY, SQL_KEY)
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, context):
+        self._cursor = cursor
+        self._context = context
+        self._unfetched = None   # stats key of a statement whose row count is still unknown
+
+    def _timed(self, method, operation, *args, **kwargs):
+        started = time.perf_counter()
+        error = True
+        try:
+            result = method(operation, *args, **kwargs)
+            error = False
+            return result
+        finally:
+            rows = -1 if error else getattr(self._cursor, "rowcount", -1)
+            rows = -1 if rows is None else rows
+            key = _record(self._context, operation, time.perf_counter() - started, rows, error)
+            self._unfetched = key if not error and rows < 0 else None
+
+    def fetchall(self):
+        result = self._cursor.fetchall()
+        if self._unfetched:
+            _add_rows(self._unfetched, len(result))
+            self._unfetched = None
+        return result
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, pool, tenant=None):
+        self._conn = conn
+        self._context = (pool, tenant)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._context)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.close()
+
+
+def instrument(conn, pool, tenant=None):
+    """Wrap `conn` when DB_METRICS_ENABLED, else return it unchanged."""
+    if not config.DB_METRICS_ENABLED:
+        return conn
+    return InstrumentedConnection(conn, pool, tenant)
@@ -0,0 +1,198 @@
+# backend/utils/importer.py
+"""
+Streaming contact import for CSV and Excel files.
+
+The file is read IMPORT_CHUNK_ROWS rows at a time (pandas chunks for CSV,
+openpyxl read-only rows for Excel), so memory stays flat whatever its size.
+Each chunk is normalized, de-duplicated against the phones already seen in
+the file and written with one multi-row INSERT IGNORE, or with LOAD DATA
+LOCAL INFILE when IMPORT_USE_LOAD_DATA is on and the server allows it.
+Counts match the old per-row import: `inserted` new customers, `skipped`
+phones that already existed, `total` distinct valid phones in the file.
+"""
+import csv
+import logging
+import os
+import tempfile
+
+import mysql.connector
+import pandas as pd
+from openpyxl import load_workbook
+
+from config import config
+from db import get_tenant_info, get_user_connection
+from utils.phone import normalize_phones
+
+logger = logging.getLogger(__name__)
+
+_INSERT_SQL = "INSERT IGNORE INTO customers (phone, name) VALUES {placeholders}"
+_LOAD_DATA_SQL = """
+    LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE customers
+    CHARACTER SET utf8mb4
+    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+    LINES TERMINATED BY '\\n'
+    (phone, @name) SET name = NULLIF(@name, '')
+"""
+# Server or client refuses LOCAL INFILE: fall back to INSERT for the rest of the file
+_LOAD_DATA_REFUSED_ERRORS = {1148, 2068, 3948, 3950}
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0        # data rows read from the file
+        self.total = 0       # distinct valid phones
+        self.inserted = 0
+        self.skipped = 0     # already in customers
+
+    def as_dict(self):
+        return {"read": self.read, "total": self.total, "inserted": self.inserted, "skipped": self.skipped}
+
+
+def _csv_chunks(path, chunksize):
+    header = pd.read_csv(path, nrows=0).columns
+    phone_columns = [c for c in header if str(c).strip().lower() == "phone"]
+    # Phones as text: inferred dtypes would differ between chunks (e.g. floats once a cell is blank)
+    yield from pd.read_csv(path, chunksize=chunksize, dtype={c: str for c in phone_columns})
+
+
+def _excel_chunks(path, chunksize):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else "" for h in header]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunksize:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_chunks(path, chunksize=None):
+    """DataFrames of at most `chunksize` rows with lower-cased column names."""
+    chunksize = chunksize or config.IMPORT_CHUNK_ROWS
+    chunks = _csv_chunks(path, chunksize) if path.lower().endswith(".csv") else _excel_chunks(path, chunksize)
+    for df in chunks:
+        df.columns = [str(c).strip().lower() for c in df.columns]
+        if "phone" not in df.columns:
+            raise ValueError("Missing 'phone' column")
+        yield df
+
+
+def prepare_chunk(df, seen):
+    """[(phone, name)] of the chunk's valid phones not seen before in the file; updates `seen`."""
+    phones = normalize_phones(df["phone"].to_numpy())
+    names = df["name"] if "name" in df.columns else pd.Series([None] * len(df), index=df.index)
+    rows = []
+    for phone, name in zip(phones, names):
+        if phone is None:
+            continue
+        key = int(phone)   # ints keep the per-file dedupe set small
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append((phone, None if pd.isna(name) else str(name)))
+    return rows
+
+
+def insert_rows(conn, rows):
+    """Multi-row INSERT IGNORE; returns the number of new rows."""
+    cur = conn.cursor()
+    try:
+        flat_values = []
+        for row in rows:
+            flat_values.extend(row)
+        cur.execute(_INSERT_SQL.format(placeholders=",".join(["(%s,%s)"] * len(rows))), flat_values)
+        conn.commit()
+        return cur.rowcount
+    finally:
+        cur.close()
+
+
+def load_rows(conn, rows):
+    """LOAD DATA LOCAL INFILE from a temporary CSV; returns the number of new rows."""
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            for phone, name in rows:
+                writer.writerow([phone, name or ""])
+        cur = conn.cursor()
+        try:
+            cur.execute(_LOAD_DATA_SQL, (path,))
+            conn.commit()
+            return cur.rowcount
+        finally:
+            cur.close()
+    finally:
+        os.remove(path)
+
+
+def _load_data_connection(user_id):
+    """Unpooled tenant connection with LOCAL INFILE enabled (pooled ones keep it off)."""
+    user = get_tenant_info(user_id)
+    return mysql.connector.connect(
+        host=user.get("db_host") or config.MAIN_DB_HOST,
+        user=user["db_user"],
+        password=user["db_password"],
+        database=user["db_name"],
+        allow_local_infile=True,
+        autocommit=True,
+    )
+
+
+def import_contacts(user_id, path, start_row=0, on_chunk=None, chunksize=None):
+    """
+    Import the contacts file at `path` into the user's customers table,
+    phones normalized by utils.phone.
+
+    Rows before `start_row` were imported by an earlier run: they are only
+    read again to rebuild the dedupe set. on_chunk(stats, next_row) is called
+    after every committed chunk. Raises ValueError for a file without a
+    phone column.
+    """
+    stats = ImportStats()
+    seen = set()
+    use_load_data = config.IMPORT_USE_LOAD_DATA
+    conn = _load_data_connection(user_id) if use_load_data else get_user_connection(user_id)
+    try:
+        for df in iter_chunks(path, chunksize):
+            first_row = stats.read
+            stats.read += len(df)
+            if stats.read <= start_row:
+                stats.total += len(prepare_chunk(df, seen))
+                continue
+            if first_row < start_row:
+                # Chunk boundaries moved (e.g. another chunk size): only rows past start_row are new
+                already = prepare_chunk(df.iloc[:start_row - first_row], seen)
+                stats.total += len(already)
+                df = df.iloc[start_row - first_row:]
+
+            rows = prepare_chunk(df, seen)
+            if rows:
+                inserted = None
+                if use_load_data:
+                    try:
+                        inserted = load_rows(conn, rows)
+                    except mysql.connector.Error as e:
+                        if e.errno not in _LOAD_DATA_REFUSED_ERRORS:
+                            raise
+                        logger.warning("LOAD DATA LOCAL refused for user %s (%s), using INSERT", user_id, e.msg)
+                        use_load_data = False
+                if inserted is None:
+                    inserted = insert_rows(conn, rows)
+                stats.total += len(rows)
+                stats.inserted += inserted
+                stats.skipped += len(rows) - inserted
+            if on_chunk:
+                on_chunk(stats, stats.read)
+    finally:
+        conn.close()
+    return stats
@@ -0,0 +1,212 @@
+# backend/utils/migrations.py
+"""
+Versioned schema migrations for tenant databases.
+
+Migrations are models/migrations/NNNN_name.sql files, applied in version
+order. Every tenant database records what it has applied in
+schema_migrations. A migration is recorded only after all of its statements
+succeeded, so a failed run can simply be repeated: statements whose effect
+already exists (error 1050 table exists, 1060 duplicate column, 1061
+duplicate key, 1091 nothing to drop) are skipped.
+
+DDL should ask for online algorithms (ALGORITHM=INSTANT / INPLACE,
+LOCK=NONE). Where the server refuses them, the statement is retried without
+those options. lock_wait_timeout is kept short, so a tenant whose tables are
+busy fails fast and is retried on the next run instead of stalling writes
+behind a metadata lock.
+
+    python -m utils.migrations                 # migrate every tenant, 8 at a time
+    python -m utils.migrations --status        # versions per tenant
+    python -m utils.migrations --tenant sya_bob --concurrency 1
+"""
+import argparse
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import mysql.connector
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "models" / "migrations"
+ALREADY_APPLIED_ERRORS = {1050, 1060, 1061, 1091}
+ONLINE_DDL_UNSUPPORTED_ERRORS = {1845, 1846}   # ALGORITHM/LOCK not supported for this operation
+_ONLINE_OPTIONS_RE = re.compile(r",\s*(ALGORITHM|LOCK)\s*=\s*\w+", re.IGNORECASE)
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+_SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def _statements(sql_script):
+    lines = [line for line in sql_script.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def load_migrations():
+    """[(version, name, statements)] in version order."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = _FILE_RE.match(path.name)
+        if not match:
+            continue
+        migrations.append((int(match.group(1)), match.group(2), _statements(path.read_text(encoding="utf-8"))))
+    return sorted(migrations)
+
+
+def record_baseline(cursor):
+    """Mark every migration as applied on a database just created from models/user_schema.sql."""
+    cursor.execute(_SCHEMA_MIGRATIONS_SQL)
+    for version, name, _ in load_migrations():
+        cursor.execute("INSERT IGNORE INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+
+
+def tenant_databases():
+    """Connection settings of every tenant database, including unclaimed spares."""
+    conn = mysql.connector.connect(host=config.MAIN_DB_HOST, user=config.MAIN_DB_USER,
+                                   password=config.MAIN_DB_PASSWORD, database=config.MAIN_DB_NAME)
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT db_host, db_user, db_password, db_name FROM users")
+        targets = cur.fetchall()
+        try:
+            cur.execute("""
+                SELECT db_host, db_user, db_password, db_name FROM tenant_spares WHERE claimed_by IS NULL
+            """)
+            targets.extend(cur.fetchall())
+        except mysql.connector.Error:
+            pass   # main schema without tenant_spares
+        cur.close()
+    finally:
+        conn.close()
+    return targets
+
+
+def _connect(target):
+    return mysql.connector.connect(
+        host=target.get("db_host") or config.MAIN_DB_HOST,
+        user=target["db_user"],
+        password=target["db_password"],
+        database=target["db_name"],
+        autocommit=True,
+    )
+
+
+def _execute(cur, stmt):
+    try:
+        cur.execute(stmt)
+    except mysql.connector.Error as e:
+        if e.errno in ALREADY_APPLIED_ERRORS:
+            return
+        if e.errno in ONLINE_DDL_UNSUPPORTED_ERRORS and _ONLINE_OPTIONS_RE.search(stmt):
+            logger.warning("Online DDL refused (%s), retrying with default algorithm: %s", e.msg, stmt[:120])
+            _execute(cur, _ONLINE_OPTIONS_RE.sub("", stmt))
+            return
+        raise
+
+
+def applied_versions(cur):
+    cur.execute(_SCHEMA_MIGRATIONS_SQL)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate_tenant(target, migrations, dry_run=False):
+    """Apply pending migrations to one tenant. Returns the versions applied (or pending for dry_run)."""
+    conn = _connect(target)
+    applied = []
+    try:
+        cur = conn.cursor()
+        cur.execute("SET SESSION lock_wait_timeout = %s", (config.MIGRATION_LOCK_WAIT_SECONDS,))
+        done = applied_versions(cur)
+        for version, name, statements in migrations:
+            if version in done:
+                continue
+            if not dry_run:
+                for stmt in statements:
+                    _execute(cur, stmt)
+                cur.execute("INSERT IGNORE INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            applied.append(version)
+        cur.close()
+    finally:
+        conn.close()
+    return applied
+
+
+def run(concurrency=None, tenants=None, dry_run=False):
+    """
+    Migrate tenant databases, `concurrency` at a time. Returns
+    {db_name: {"applied": [...]} or {"error": "..."}}; failed tenants keep
+    their recorded version and are picked up by the next run.
+    """
+    migrations = load_migrations()
+    targets = tenant_databases()
+    if tenants:
+        targets = [t for t in targets if t["db_name"] in tenants]
+    concurrency = concurrency or config.MIGRATION_CONCURRENCY
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(migrate_tenant, target, migrations, dry_run): target["db_name"] for target in targets}
+        for future in as_completed(futures):
+            db_name = futures[future]
+            try:
+                results[db_name] = {"applied": future.result()}
+            except Exception as exc:
+                logger.error("Migration of %s failed: %s", db_name, exc)
+                results[db_name] = {"error": str(exc)}
+    failed = sum(1 for r in results.values() if "error" in r)
+    logger.info("Migrated %d tenant databases (%d failed)", len(results) - failed, failed)
+    return results
+
+
+def status(tenants=None):
+    """{db_name: latest applied version} (None if it cannot be read)."""
+    targets = tenant_databases()
+    if tenants:
+        targets = [t for t in targets if t["db_name"] in tenants]
+    versions = {}
+    for target in targets:
+        try:
+            conn = _connect(target)
+            try:
+                cur = conn.cursor()
+                versions[target["db_name"]] = max(applied_versions(cur), default=0)
+                cur.close()
+            finally:
+                conn.close()
+        except mysql.connector.Error as exc:
+            logger.warning("Cannot read schema version of %s: %s", target["db_name"], exc)
+            versions[target["db_name"]] = None
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply models/migrations to tenant databases")
+    parser.add_argument("--concurrency", type=int, default=config.MIGRATION_CONCURRENCY)
+    parser.add_argument("--tenant", action="append", help="db_name to migrate (repeatable); default all")
+    parser.add_argument("--dry-run", action="store_true", help="list pending versions without applying them")
+    parser.add_argument("--status", action="store_true", help="print the schema version of each tenant")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    if args.status:
+        print(json.dumps(status(args.tenant), indent=2))
+        return
+    results = run(args.concurrency, args.tenant, args.dry_run)
+    print(json.dumps(results, indent=2))
+    if any("error" in r for r in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
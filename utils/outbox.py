@@ -0,0 +1,173 @@
+# backend/utils/outbox.py
+"""
+Write-behind outbox for send outcomes (SMS_RESULT_SINK=outbox).
+
+Senders append their result rows to the Redis stream `sms:outbox` instead of
+writing sent_messages themselves; the outbox.flush task reads the stream with
+a consumer group, applies each tenant's rows with one multi-row upsert and
+XACKs the entries only after the commit. Entries of a crashed flusher are
+taken over with XAUTOCLAIM, so every outcome is applied at least once; each
+row carries its entry id into sent_messages.outbox_entry, so an entry that
+was committed but not acknowledged is not applied twice when replayed.
+
+sms:outbox:pending:{user_id} counts a tenant's rows that are not applied yet;
+the retry pass waits for it to drain so it reads every recorded failure.
+"""
+import json
+import logging
+import os
+import socket
+
+from redis.exceptions import RedisError, ResponseError
+
+from celery_app import celery_app
+from config import config
+from db import get_user_connection
+from utils.redis_client import get_redis
+from utils.sent_messages import SentMessageBuffer, upsert_send_results
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "sms:outbox"
+GROUP = "outbox-writers"
+KICK_KEY = "sms:outbox:kick"
+
+
+def _pending_key(user_id):
+    return f"sms:outbox:pending:{user_id}"
+
+
+def pending(user_id):
+    """Rows queued for `user_id` that are not in sent_messages yet, or None if Redis cannot tell."""
+    try:
+        return int(get_redis().get(_pending_key(user_id)) or 0)
+    except RedisError as exc:
+        logger.warning("Cannot read outbox backlog of user %s: %s", user_id, exc)
+        return None
+
+
+def kick(delay=None):
+    """Schedule one flush; further calls within the delay are coalesced into it."""
+    delay = config.OUTBOX_FLUSH_DELAY_SECONDS if delay is None else delay
+    if get_redis().set(KICK_KEY, 1, nx=True, ex=int(delay) + 1):
+        flush_outbox.apply_async(countdown=delay)
+
+
+def append(user_id, rows):
+    """Queue result rows for `user_id` as a single stream entry."""
+    client = get_redis()
+    pipe = client.pipeline()
+    pipe.xadd(STREAM_KEY, {"user_id": user_id, "rows": json.dumps(rows)})
+    pipe.incrby(_pending_key(user_id), len(rows))
+    pipe.execute()
+    kick()
+
+
+class OutboxBuffer(SentMessageBuffer):
+    """
+    SentMessageBuffer whose flush appends to the outbox stream instead of the
+    tenant database. If Redis cannot take the rows they are written directly,
+    so outcomes are never dropped.
+    """
+
+    def __init__(self, user_id, conn, max_rows=None, max_age=None):
+        super().__init__(conn, max_rows, max_age)
+        self.user_id = user_id
+
+    def _write(self, rows):
+        try:
+            append(self.user_id, rows)
+        except RedisError as exc:
+            logger.warning("Outbox unavailable for user %s, writing %d rows directly: %s",
+                           self.user_id, len(rows), exc)
+            upsert_send_results(self.conn, rows)
+
+
+def result_buffer(user_id, conn):
+    """The buffer for send outcomes according to SMS_RESULT_SINK."""
+    if config.SMS_RESULT_SINK == "outbox":
+        return OutboxBuffer(user_id, conn)
+    return SentMessageBuffer(conn)
+
+
+def _ensure_group(client):
+    try:
+        client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def _entry_keys(entry_id, count):
+    """Keys of an entry's rows that sort like the stream: zero-padded "<ms>-<seq>" plus the row index."""
+    ms, _, seq = entry_id.partition("-")
+    prefix = f"{int(ms):013d}{int(seq or 0):08d}"
+    return [f"{prefix}{i:05d}" for i in range(count)]
+
+
+def _apply(client, entries):
+    """Apply stream entries per tenant; returns (rows applied, tenants that failed)."""
+    by_tenant = {}
+    for entry_id, fields in entries:
+        ids, rows, keys = by_tenant.setdefault(int(fields["user_id"]), ([], [], []))
+        ids.append(entry_id)
+        entry_rows = [tuple(r) for r in json.loads(fields["rows"])]
+        rows.extend(entry_rows)
+        keys.extend(_entry_keys(entry_id, len(entry_rows)))
+
+    applied, failed = 0, []
+    for user_id, (ids, rows, keys) in by_tenant.items():
+        try:
+            conn = get_user_connection(user_id)
+            try:
+                upsert_send_results(conn, rows, keys)
+            finally:
+                conn.close()
+        except Exception as exc:
+            # Left unacknowledged: XAUTOCLAIM hands the entries to a later flush
+            logger.warning("Outbox flush for user %s failed, will retry %d rows: %s", user_id, len(rows), exc)
+            failed.append(user_id)
+            continue
+        pipe = client.pipeline()
+        pipe.xack(STREAM_KEY, GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        pipe.decrby(_pending_key(user_id), len(rows))
+        pipe.execute()
+        applied += len(rows)
+    return applied, failed
+
+
+@celery_app.task(name="outbox.flush")
+def flush_outbox():
+    """Drain the outbox stream into the tenant databases."""
+    client = get_redis()
+    client.delete(KICK_KEY)
+    _ensure_group(client)
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    claim_idle_ms = config.OUTBOX_CLAIM_IDLE_SECONDS * 1000
+
+    applied, failed = 0, set()
+    # Entries left pending by a flusher that died (or by a failed tenant write) first
+    start = "0-0"
+    while True:
+        start, entries = client.xautoclaim(STREAM_KEY, GROUP, consumer, claim_idle_ms, start,
+                                           count=config.OUTBOX_FLUSH_BATCH)[:2]
+        if entries:
+            n, bad = _apply(client, entries)
+            applied += n
+            failed.update(bad)
+        if start == "0-0":
+            break
+
+    while True:
+        response = client.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=config.OUTBOX_FLUSH_BATCH)
+        if not response:
+            break
+        n, bad = _apply(client, response[0][1])
+        applied += n
+        failed.update(bad)
+
+    if failed:
+        kick(config.OUTBOX_CLAIM_IDLE_SECONDS)
+    logger.info("Outbox flush applied %d rows (failed tenants: %s)", applied, sorted(failed) or "none")
+    return {"status": "ok", "applied": applied, "failed_users": sorted(failed)}
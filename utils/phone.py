@@ -0,0 +1,292 @@
+# backend/utils/phone.py
+"""
+Phone number normalization driven by a numbering-plan table.
+
+Numbers are stored as E.164 digits without the "+" (e.g. 201061463163). An
+input is read as:
+
+  * international when it starts with "+" or "00": the country calling code
+    is matched against NUMBERING_PLANS and the rest must be a valid national
+    number of that country; a calling code missing from the table only needs
+    a plausible E.164 number (8 to 15 digits, not starting with 0);
+  * national for the default country (PHONE_DEFAULT_COUNTRY), with or
+    without that country's trunk prefix (the "0" in 010...);
+  * otherwise international without the "+" (e.g. 201061463163).
+
+A national number is valid when its length and first digit are those of a
+mobile or landline number of the plan. Anything else is invalid (None). Spaces, dashes, dots and brackets
+are ignored, Arabic-Indic digits count as digits and a trailing ".0" (a
+phone read from a numeric Excel cell) is dropped.
+
+normalize_phone() handles one value; normalize_phones() does the same for a
+whole pandas Series / NumPy array at once, without a Python-level loop.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from config import config
+
+# region: (calling code, trunk prefix, mobile lengths, mobile leading digits, landline lengths)
+# A landline may start with any digit but the trunk prefix.
+NUMBERING_PLANS = {
+    "EG": ("20", "0", (10,), "1", (8, 9)),
+    "SA": ("966", "0", (9,), "5", (8,)),
+    "AE": ("971", "0", (9,), "5", (8,)),
+    "KW": ("965", "", (8,), "4569", (8,)),
+    "QA": ("974", "", (8,), "3567", (8,)),
+    "BH": ("973", "", (8,), "36", (8,)),
+    "OM": ("968", "", (8,), "79", (8,)),
+    "JO": ("962", "0", (9,), "7", (8,)),
+    "LB": ("961", "0", (7, 8), "3789", (7, 8)),
+    "IQ": ("964", "0", (10,), "7", (8, 9)),
+    "SY": ("963", "0", (9,), "9", (8, 9)),
+    "PS": ("970", "0", (9,), "5", (8,)),
+    "YE": ("967", "0", (9,), "7", (7, 8)),
+    "LY": ("218", "0", (9,), "9", (8, 9)),
+    "SD": ("249", "0", (9,), "19", (9,)),
+    "TN": ("216", "", (8,), "2459", (8,)),
+    "DZ": ("213", "0", (9,), "567", (8,)),
+    "MA": ("212", "0", (9,), "67", (9,)),
+    "NG": ("234", "0", (10,), "789", (7, 8)),
+    "KE": ("254", "0", (9,), "17", (7, 8, 9)),
+    "ZA": ("27", "0", (9,), "678", (9,)),
+    "TR": ("90", "0", (10,), "5", (10,)),
+    "IN": ("91", "0", (10,), "6789", (10,)),
+    "PK": ("92", "0", (10,), "3", (9, 10)),
+    "GB": ("44", "0", (10,), "7", (9, 10)),
+    "FR": ("33", "0", (9,), "67", (9,)),
+    "DE": ("49", "0", (10, 11), "1", (6, 7, 8, 9, 10, 11)),
+    "IT": ("39", "", (9, 10), "3", (6, 7, 8, 9, 10, 11)),
+    "ES": ("34", "", (9,), "67", (9,)),
+    "US": ("1", "1", (10,), "23456789", (10,)),
+    "CA": ("1", "1", (10,), "23456789", (10,)),
+}
+
+MAX_INPUT_CHARS = 32
+_MAX_DIGITS = 15   # E.164
+_MIN_DIGITS = 8    # shortest number accepted for a calling code without a plan
+_NON_DIGITS_RE = re.compile(r"[^0-9]")
+_LEADING_PLUS_RE = re.compile(r"^[^0-9]*\+")
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+
+def _validity(plans):
+    """(_MAX_DIGITS + 2, 10) bool matrix: [national length, leading digit] allowed by any of `plans`."""
+    valid = np.zeros((_MAX_DIGITS + 2, 10), dtype=bool)
+    for _, trunk, lengths, leading, landline in plans:
+        for length in lengths:
+            valid[length, [int(d) for d in leading]] = True
+        for length in landline:
+            valid[length, [d for d in range(10) if str(d) != trunk[:1]]] = True
+    return valid
+
+
+def _build_tables():
+    by_code = {}
+    for plan in NUMBERING_PLANS.values():
+        by_code.setdefault(plan[0], []).append(plan)   # regions sharing a code (NANP) are merged
+    codes = sorted(by_code)
+    by_prefix = {size: np.full(10 ** size, -1, dtype=np.int16) for size in (1, 2, 3)}
+    for i, code in enumerate(codes):
+        by_prefix[len(code)][int(code)] = i
+    valid = np.stack([_validity(by_code[code]) for code in codes])
+    code_lengths = np.array([len(code) for code in codes], dtype=np.int16)
+    return {code: valid[i] for i, code in enumerate(codes)}, by_prefix, valid, code_lengths
+
+
+_CODE_VALIDITY, _BY_PREFIX, _VALIDITY, _CODE_LENGTHS = _build_tables()
+_PLAN_VALIDITY = {region: _validity([plan]) for region, plan in NUMBERING_PLANS.items()}
+
+
+def _plan(country):
+    """(calling code, trunk prefix, validity matrix) of a region."""
+    country = (country or config.PHONE_DEFAULT_COUNTRY).upper()
+    if country not in NUMBERING_PLANS:
+        raise ValueError(f"No numbering plan for country '{country}'")
+    return NUMBERING_PLANS[country][0], NUMBERING_PLANS[country][1], _PLAN_VALIDITY[country]
+
+
+def _is_valid(valid, national):
+    return 0 < len(national) <= _MAX_DIGITS and bool(valid[len(national), int(national[0])])
+
+
+def _international(digits):
+    for size in (1, 2, 3):
+        valid = _CODE_VALIDITY.get(digits[:size])
+        if valid is not None:
+            return digits if _is_valid(valid, digits[size:]) else None
+    return digits if _MIN_DIGITS <= len(digits) <= _MAX_DIGITS and digits[0] != "0" else None
+
+
+def normalize_phone(phone, default_country=None):
+    """E.164 digits (no "+") for one phone number, or None if it is not valid."""
+    if phone is None or (isinstance(phone, float) and phone != phone):
+        return None
+    text = str(phone)
+    if len(text) > MAX_INPUT_CHARS:
+        return None
+    text = text.translate(_ARABIC_DIGITS)
+    head, dot, tail = text.partition(".")
+    if dot and not tail.strip("0 "):
+        text = head
+    digits = _NON_DIGITS_RE.sub("", text)
+    if not digits:
+        return None
+    if _LEADING_PLUS_RE.match(text):
+        return _international(digits)
+    if digits.startswith("00"):
+        return _international(digits[2:])
+
+    code, trunk, valid = _plan(default_country)
+    if trunk and digits.startswith(trunk) and _is_valid(valid, digits[len(trunk):]):
+        return code + digits[len(trunk):]
+    if _is_valid(valid, digits):
+        return code + digits
+    return _international(digits)
+
+
+# --- Vectorized version: the same rules over an (n, width) matrix of ASCII codes ---
+
+_ZERO, _NINE, _PLUS, _DOT, _SPACE = (ord(c) for c in "09+. ")
+
+
+def _as_ascii(values):
+    """(n, width) uint8 matrix of the values' characters, NUL padded, and a too-long mask."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "U":
+        strings = values.ravel()
+    else:
+        strings = np.asarray(values, dtype=object).astype(str)
+    width = max(strings.dtype.itemsize // 4, 1)
+    if width > MAX_INPUT_CHARS:
+        strings = strings.astype(f"U{MAX_INPUT_CHARS + 1}")
+        width = MAX_INPUT_CHARS + 1
+    chars = np.ascontiguousarray(strings).view(np.uint32).reshape(len(strings), width)
+    too_long = chars[:, MAX_INPUT_CHARS] != 0 if width > MAX_INPUT_CHARS else np.zeros(len(strings), dtype=bool)
+    if chars.max() >= 0x80:
+        chars = chars.copy()
+        for first in (0x660, 0x6F0):   # Arabic-Indic and Extended Arabic-Indic digits
+            arabic = (chars >= first) & (chars <= first + 9)
+            chars[arabic] -= first - _ZERO
+        # Any other non-ASCII character becomes DEL: neither a digit nor "+" / "."
+        np.minimum(chars, 0x7F, out=chars)
+    return chars.astype(np.uint8), too_long
+
+
+def _digits_only(text):
+    """Left-align each row's digits (still ASCII codes); returns them, their count and the digit mask."""
+    is_digit = (text >= _ZERO) & (text <= _NINE)
+
+    # A "." followed only by zeros (or spaces) is a float rendering, not part of the number
+    dotted = np.flatnonzero((text == _DOT).any(axis=1))
+    if dotted.size:
+        sub = text[dotted]
+        is_dot = sub == _DOT
+        dots_so_far = np.cumsum(is_dot, axis=1, dtype=np.int8)
+        other = (sub != _ZERO) & (sub != _SPACE) & (sub != 0)
+        suffix = ~((dots_so_far > is_dot) & other).any(axis=1)
+        is_digit[dotted[suffix]] &= dots_so_far[suffix] == 0
+
+    digits = text.copy()
+    # Most rows are digits only; compact just the others
+    dirty = np.flatnonzero(~(is_digit | (text == 0)).all(axis=1))
+    if dirty.size:
+        # Column by column: each digit goes to its row's next free slot (a slot is free until written)
+        width = text.shape[1]
+        columns, keep = text[dirty].T.copy(), is_digit[dirty].T.copy()
+        compact = np.zeros(dirty.size * width, dtype=np.uint8)
+        slot = np.arange(0, compact.size, width)
+        for j in range(width):
+            compact[slot] = np.where(keep[j], columns[j], 0)
+            slot += keep[j]
+        digits[dirty] = compact.reshape(dirty.size, width)
+    return digits, is_digit.sum(axis=1, dtype=np.int16), is_digit
+
+
+def _shift_left(digits, rows, by):
+    digits[rows, :-by] = digits[rows, by:]
+    digits[rows, -by:] = 0
+
+
+def _lead(digits, column):
+    """Digit value (0-9) at `column` (an int or one per row); 0 past the end (the length check fails there)."""
+    if isinstance(column, int):
+        values = digits[:, column]
+    else:
+        values = np.take_along_axis(digits, column.astype(np.intp)[:, None], axis=1)[:, 0]
+    return np.where(values >= _ZERO, values - _ZERO, 0)
+
+
+def normalize_phones(values, default_country=None):
+    """
+    normalize_phone over a Series, array or list. Returns an object array of
+    E.164 strings / None, or a Series with the same index for a Series input.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    if len(values) == 0:
+        result = np.empty(0, dtype=object)
+        return pd.Series(result, index=index, dtype=object) if index is not None else result
+
+    text, too_long = _as_ascii(values)
+    digits, count, is_digit = _digits_only(text)
+    width = max(digits.shape[1], _MAX_DIGITS + 4)
+    if digits.shape[1] < width:
+        digits = np.pad(digits, ((0, 0), (0, width - digits.shape[1])))
+
+    plus = np.zeros(len(text), dtype=bool)
+    with_plus = np.flatnonzero((text == _PLUS).any(axis=1))
+    if with_plus.size:
+        plus[with_plus] = (text[with_plus] == _PLUS).argmax(axis=1) < is_digit[with_plus].argmax(axis=1)
+    double_zero = ~plus & (count >= 2) & (digits[:, 0] == _ZERO) & (digits[:, 1] == _ZERO)
+    explicit = plus | double_zero
+
+    # National reading for the default country (only without "+" / "00")
+    code, trunk, valid = _plan(default_country)
+    national_len = np.clip(count, 0, _MAX_DIGITS + 1)
+    trunk_ok = np.zeros(len(text), dtype=bool)
+    if trunk:
+        trunk_ok = ~explicit & (count > len(trunk))
+        for i, digit in enumerate(trunk):
+            trunk_ok &= digits[:, i] == ord(digit)
+        trunk_len = np.clip(count - len(trunk), 0, _MAX_DIGITS + 1)
+        trunk_ok &= valid[trunk_len, _lead(digits, len(trunk))]
+    plain_ok = ~explicit & ~trunk_ok & valid[national_len, _lead(digits, 0)]
+    national = trunk_ok | plain_ok
+
+    # International reading: calling code, then a valid national number of that country
+    # (any plausible E.164 number for a calling code without a plan)
+    intl = np.flatnonzero(~national)
+    idigits = digits[intl]
+    _shift_left(idigits, np.flatnonzero(double_zero[intl]), 2)
+    icount = count[intl] - np.where(double_zero[intl], 2, 0)
+    code_index = np.full(intl.size, -1, dtype=np.int16)
+    prefix = np.zeros(intl.size, dtype=np.int16)
+    for size in (1, 2, 3):
+        column = idigits[:, size - 1]
+        prefix = prefix * 10 + np.where(column >= _ZERO, column - _ZERO, 0)
+        candidate = _BY_PREFIX[size][prefix]
+        hit = (code_index < 0) & (icount >= size) & (candidate >= 0)
+        code_index[hit] = candidate[hit]
+    found = code_index >= 0
+    code_len = np.where(found, _CODE_LENGTHS[np.maximum(code_index, 0)], 0)
+    ilen = np.clip(icount - code_len, 0, _MAX_DIGITS + 1)
+    intl_ok = np.where(found, _VALIDITY[np.maximum(code_index, 0), ilen, _lead(idigits, code_len)],
+                       (icount >= _MIN_DIGITS) & (icount <= _MAX_DIGITS) & (idigits[:, 0] != _ZERO))
+
+    ok = national.copy()
+    ok[intl] = intl_ok
+    ok &= ~too_long & (count > 0)
+
+    # Output: calling code + national number, or the international digits as they are
+    out = np.zeros((len(text), _MAX_DIGITS), dtype=np.uint8)
+    out[intl] = idigits[:, :_MAX_DIGITS]
+    out[national, :len(code)] = np.frombuffer(code.encode(), dtype=np.uint8)
+    body = _MAX_DIGITS - len(code)
+    out[plain_ok, len(code):] = digits[plain_ok, :body]
+    if trunk:
+        out[trunk_ok, len(code):] = digits[trunk_ok, len(trunk):len(trunk) + body]
+
+    result = out.astype(np.uint32).view(f"U{_MAX_DIGITS}").ravel().astype(object)
+    result[~ok] = None
+    return pd.Series(result, index=index, dtype=object) if index is not None else result
@@ -0,0 +1,242 @@
+# backend/utils/pool_manager.py
+"""
+Bounded MySQL connection pools keyed by tenant (or any hashable key).
+
+One PoolManager owns every pool and a global connection budget. A pool grows
+up to `pool_size` connections on demand; when the budget is used up, idle
+connections of the least recently used pools are closed to make room, and
+pools without connections are dropped. A checkout that finds neither a free
+connection nor room waits up to `timeout` seconds and then raises PoolError,
+like mysql-connector's own pool does immediately.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class _Pool:
+    __slots__ = ("key", "params", "idle", "in_use", "retired", "created", "checkouts", "waits",
+                 "timeouts", "evicted", "last_used")
+
+    def __init__(self, key, params):
+        self.key = key
+        self.params = params
+        self.idle = deque()      # (connection, returned_at), most recently returned on the right
+        self.in_use = 0
+        self.retired = False     # settings changed or pool dropped: connections close on return
+        self.created = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.evicted = 0
+        self.last_used = time.monotonic()
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; close() hands it back to the pool."""
+
+    def __init__(self, manager, pool, conn):
+        self._manager = manager
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise PoolError("Connection was returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._manager._release(self._pool, conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PoolManager:
+    def __init__(self, name, max_connections, pool_size, idle_seconds=300, ping_after=30):
+        self.name = name
+        self.max_connections = max_connections
+        self.pool_size = pool_size
+        self.idle_seconds = idle_seconds
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._pools = OrderedDict()   # key -> _Pool, least recently used first
+        self._open = 0
+        self._reaped_at = time.monotonic()
+
+    # --- checkout / release ---
+    def get_connection(self, key, params, timeout=10):
+        """
+        Connection for `key` built from `params` (mysql.connector.connect kwargs).
+        A pool whose params changed is retired and replaced.
+        """
+        deadline = time.monotonic() + timeout
+        to_close = []
+        conn = None
+        with self._cond:
+            self._reap_idle(to_close)
+            pool = self._pools.get(key)
+            if pool is None or pool.params != params:
+                if pool is not None:
+                    self._retire(pool, to_close)
+                pool = self._pools[key] = _Pool(key, params)
+            self._pools.move_to_end(key)
+
+            waited = False
+            while True:
+                if pool.idle:
+                    conn, returned_at = pool.idle.pop()
+                    break
+                if pool.in_use < self.pool_size:
+                    if self._open >= self.max_connections:
+                        self._evict_one(pool, to_close)
+                    if self._open < self.max_connections:
+                        self._open += 1
+                        pool.created += 1
+                        returned_at = None
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    pool.timeouts += 1
+                    self._close_all(to_close)
+                    raise PoolError(f"{self.name} pool for {key} exhausted "
+                                    f"({pool.in_use}/{self.pool_size} in use, {self._open}/{self.max_connections} open)")
+                if not waited:
+                    pool.waits += 1
+                    waited = True
+                self._cond.wait(remaining)
+                # The pool may have been retired or dropped while this thread waited
+                if self._pools.get(key) is not pool:
+                    pool = self._pools.setdefault(key, _Pool(key, params))
+            pool.in_use += 1
+            pool.checkouts += 1
+            pool.last_used = time.monotonic()
+        self._close_all(to_close)
+
+        try:
+            if conn is None:
+                conn = mysql.connector.connect(**params)
+            elif time.monotonic() - returned_at > self.ping_after:
+                conn.ping(reconnect=True, attempts=1)
+        except Exception:
+            with self._cond:
+                pool.in_use -= 1
+                self._open -= 1
+                self._cond.notify_all()
+            raise
+        return PooledConnection(self, pool, conn)
+
+    def _release(self, pool, conn):
+        reusable = not pool.retired
+        if reusable:
+            # Like pool_reset_session=True: the next borrower gets a clean session (no open
+            # transaction, session or user variables, temporary tables or unread results)
+            try:
+                if conn.unread_result:
+                    conn.consume_results()
+                conn.reset_session()
+                if "autocommit" in pool.params:
+                    conn.autocommit = pool.params["autocommit"]   # back to the server default after a reset
+            except Exception:
+                reusable = False
+        with self._cond:
+            pool.in_use -= 1
+            pool.last_used = time.monotonic()
+            if reusable and self._pools.get(pool.key) is pool:
+                pool.idle.append((conn, time.monotonic()))
+                conn = None
+            else:
+                self._open -= 1
+            self._cond.notify_all()
+        if conn is not None:
+            self._close_all([conn])
+
+    # --- eviction ---
+    def _evict_one(self, keep, to_close):
+        """Close the oldest idle connection of the least recently used pool other than `keep`."""
+        for key, pool in list(self._pools.items()):
+            if pool is keep or not pool.idle:
+                continue
+            conn, _ = pool.idle.popleft()
+            to_close.append(conn)
+            self._open -= 1
+            pool.evicted += 1
+            if not pool.idle and not pool.in_use:
+                del self._pools[key]
+            logger.info("%s pool: evicted an idle connection of %s for the connection budget", self.name, key)
+            return True
+        return False
+
+    def _reap_idle(self, to_close):
+        """Close connections idle for more than idle_seconds (checked at most every 10% of it)."""
+        now = time.monotonic()
+        if now - self._reaped_at < self.idle_seconds / 10.0:
+            return
+        self._reaped_at = now
+        for key, pool in list(self._pools.items()):
+            while pool.idle and now - pool.idle[0][1] > self.idle_seconds:
+                to_close.append(pool.idle.popleft()[0])
+                self._open -= 1
+            if not pool.idle and not pool.in_use and now - pool.last_used > self.idle_seconds:
+                del self._pools[key]
+
+    def _retire(self, pool, to_close):
+        pool.retired = True
+        while pool.idle:
+            to_close.append(pool.idle.popleft()[0])
+            self._open -= 1
+        if self._pools.get(pool.key) is pool:
+            del self._pools[pool.key]
+
+    def drop(self, key):
+        """Retire the pool for `key`; connections in use close when they are returned."""
+        to_close = []
+        with self._cond:
+            pool = self._pools.get(key)
+            if pool is not None:
+                self._retire(pool, to_close)
+            self._cond.notify_all()
+        self._close_all(to_close)
+
+    @staticmethod
+    def _close_all(conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # --- stats ---
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "max_connections": self.max_connections,
+                "pool_size": self.pool_size,
+                "open": self._open,
+                "pools": {
+                    str(key): {
+                        "in_use": pool.in_use,
+                        "idle": len(pool.idle),
+                        "utilization": round(pool.in_use / self.pool_size, 2),
+                        "created": pool.created,
+                        "checkouts": pool.checkouts,
+                        "waits": pool.waits,
+                        "timeouts": pool.timeouts,
+                        "evicted": pool.evicted,
+                        "idle_for_seconds": round(now - pool.last_used, 1),
+                    }
+                    for key, pool in self._pools.items()
+                },
+            }
@@ -0,0 +1,111 @@
+# backend/utils/progress.py
+"""
+SMS sending progress kept in Redis so Celery workers and every gunicorn
+worker see the same numbers. One hash per tenant (current campaign) and one
+per campaign; counters are updated with HINCRBY so concurrent batches add up.
+"""
+import logging
+import time
+
+import redis
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_PROGRESS_TTL = 7 * 24 * 3600
+
+# KEYS: tenant hash, campaign hash
+# ARGV: campaign_id, sent delta, failed delta, now
+# A hash without 'total' was cleared (or has expired) and the tenant hash may belong to
+# a newer campaign: those are left alone instead of being recreated with partial counters.
+# 'failed' never goes below 0 (retry passes also retry failures of earlier campaigns).
+_RECORD_LUA = """
+for i, key in ipairs(KEYS) do
+    if redis.call('HEXISTS', key, 'total') == 1
+            and (i == 2 or redis.call('HGET', key, 'campaign_id') == ARGV[1]) then
+        redis.call('HINCRBY', key, 'sent', ARGV[2])
+        if redis.call('HINCRBY', key, 'failed', ARGV[3]) < 0 then
+            redis.call('HSET', key, 'failed', 0)
+        end
+        redis.call('HSET', key, 'updated_at', ARGV[4])
+    end
+end
+return 0
+"""
+
+_record_script = None
+
+
+def _tenant_key(user_id):
+    return f"sms:progress:{user_id}"
+
+
+def _campaign_key(user_id, campaign_id):
+    return f"sms:progress:{user_id}:{campaign_id}"
+
+
+def start_progress(user_id, campaign_id, total):
+    """Reset the tenant's progress for a newly started campaign of `total` recipients."""
+    now = time.time()
+    fields = {"campaign_id": campaign_id, "total": total, "sent": 0, "failed": 0,
+              "started_at": now, "updated_at": now}
+    pipe = get_redis().pipeline()
+    pipe.delete(_tenant_key(user_id))
+    pipe.hset(_tenant_key(user_id), mapping=fields)
+    pipe.hset(_campaign_key(user_id, campaign_id), mapping=fields)
+    pipe.expire(_campaign_key(user_id, campaign_id), CAMPAIGN_PROGRESS_TTL)
+    pipe.execute()
+
+
+def record_progress(user_id, campaign_id, sent, failed, retry=False):
+    """
+    Add a batch's outcomes. In retry passes the recipients were already counted
+    as failed, so a success moves one from failed to sent and a failure adds nothing.
+    Outcomes of a campaign whose progress was cleared are dropped.
+    """
+    global _record_script
+    if retry:
+        sent_delta, failed_delta = sent, -sent
+    else:
+        sent_delta, failed_delta = sent, failed
+    if not sent_delta and not failed_delta:
+        return
+    try:
+        client = get_redis()
+        if _record_script is None:
+            _record_script = client.register_script(_RECORD_LUA)
+        _record_script(keys=[_tenant_key(user_id), _campaign_key(user_id, campaign_id)],
+                       args=[campaign_id, sent_delta, failed_delta, time.time()], client=client)
+    except redis.RedisError as exc:
+        logger.warning("Could not record SMS progress for user %s: %s", user_id, exc)
+
+
+def clear_progress(user_id):
+    get_redis().delete(_tenant_key(user_id))
+
+
+def get_progress(user_id, campaign_id=None):
+    """Counters plus derived remaining, rate (msgs/s) and ETA (seconds) for the tenant or one campaign."""
+    key = _campaign_key(user_id, campaign_id) if campaign_id else _tenant_key(user_id)
+    raw = get_redis().hgetall(key)
+    sent = int(raw.get("sent") or 0)
+    failed = int(raw.get("failed") or 0)
+    total = int(raw.get("total") or 0)
+    remaining = max(total - sent - failed, 0)
+
+    started_at = float(raw.get("started_at") or 0)
+    updated_at = float(raw.get("updated_at") or 0)
+    elapsed = updated_at - started_at
+    rate = (sent + failed) / elapsed if elapsed > 0 else 0.0
+    eta = remaining / rate if rate > 0 else None
+
+    return {
+        "campaign_id": int(raw["campaign_id"]) if raw.get("campaign_id") else None,
+        "sent": sent,
+        "failed": failed,
+        "remaining": remaining,
+        "total": total,
+        "rate": round(rate, 2),
+        "eta_seconds": round(eta) if eta is not None else None,
+    }
@@ -0,0 +1,141 @@
+# backend/utils/providers.py
+import logging
+
+from config import config
+from utils.rate_limit import provider_host
+
+logger = logging.getLogger(__name__)
+
+
+class SmsProvider:
+    """
+    Adapter for one provider HTTP API. The base class speaks the generic
+    single-recipient JSON payload the runner has always sent.
+
+    A request carries a list of (phone, text) messages; parse_response maps
+    the provider answer back to {phone: accepted}.
+    """
+    max_recipients = 1
+    mixed_text = False  # True if one request may carry different texts
+
+    def build_request(self, messages, sender_id, token):
+        phone, text = messages[0]
+        payload = {
+            "recipient": phone,
+            "sender_id": sender_id,
+            "type": "plain",
+            "message": text,
+        }
+        return payload, self.headers(token)
+
+    def headers(self, token):
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+
+    def parse_response(self, resp, data, messages):
+        ok = resp.status_code == 200 and data.get("status") == "success"
+        return {phone: ok for phone, _ in messages}
+
+
+class WhySmsProvider(SmsProvider):
+    """bulk.whysms.com: same payload, comma-separated recipients, one status per request."""
+    max_recipients = 100
+
+    def build_request(self, messages, sender_id, token):
+        payload, headers = super().build_request(messages, sender_id, token)
+        payload["recipient"] = ",".join(phone for phone, _ in messages)
+        return payload, headers
+
+
+class TermiiProvider(SmsProvider):
+    """api.ng.termii.com: `to` accepts an array, auth is the api_key in the body."""
+    max_recipients = 100
+
+    def build_request(self, messages, sender_id, token):
+        payload = {
+            "to": [phone for phone, _ in messages],
+            "from": sender_id,
+            "sms": messages[0][1],
+            "type": "plain",
+            "channel": "generic",
+            "api_key": token,
+        }
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        return payload, headers
+
+    def parse_response(self, resp, data, messages):
+        ok = resp.status_code == 200 and str(data.get("code", "")).lower() == "ok"
+        return {phone: ok for phone, _ in messages}
+
+
+class InfobipProvider(SmsProvider):
+    """api.infobip.com /sms/2/text/advanced: many destinations and texts, per-recipient status."""
+    max_recipients = 500
+    mixed_text = True
+    REJECTED_GROUPS = {"REJECTED", "UNDELIVERABLE", "EXPIRED"}
+
+    def build_request(self, messages, sender_id, token):
+        by_text = {}
+        for phone, text in messages:
+            by_text.setdefault(text, []).append({"to": phone})
+        payload = {
+            "messages": [
+                {"from": sender_id, "destinations": destinations, "text": text}
+                for text, destinations in by_text.items()
+            ]
+        }
+        headers = self.headers(token)
+        headers["Authorization"] = f"App {token}"
+        return payload, headers
+
+    def parse_response(self, resp, data, messages):
+        results = {phone: False for phone, _ in messages}
+        if resp.status_code != 200:
+            return results
+        for item in data.get("messages") or []:
+            group = ((item.get("status") or {}).get("groupName") or "").upper()
+            phone = item.get("to")
+            if phone in results:
+                results[phone] = group not in self.REJECTED_GROUPS
+        return results
+
+
+PROVIDERS = {
+    "bulk.whysms.com": WhySmsProvider,
+    "api.ng.termii.com": TermiiProvider,
+    "api.infobip.com": InfobipProvider,
+}
+
+
+def get_provider(api_url):
+    """Adapter instance for the provider behind api_url (generic single-recipient by default)."""
+    host = provider_host(api_url)
+    provider = PROVIDERS.get(config.SMS_PROVIDER_ADAPTERS.get(host, host), SmsProvider)()
+    override = config.SMS_PROVIDER_MAX_RECIPIENTS.get(host)
+    if override:
+        provider.max_recipients = max(1, int(override))
+    return provider
+
+
+def pack_messages(provider, messages):
+    """
+    Split (phone, text) messages into provider requests of at most
+    provider.max_recipients, keeping recipient order. Providers that take a
+    single text per request only get runs of identical text packed together.
+    """
+    requests_ = []
+    current = []
+    for phone, text in messages:
+        if current and (
+            len(current) >= provider.max_recipients
+            or (not provider.mixed_text and current[-1][1] != text)
+        ):
+            requests_.append(current)
+            current = []
+        current.append((phone, text))
+    if current:
+        requests_.append(current)
+    return requests_
@@ -0,0 +1,269 @@
+# backend/utils/provisioning.py
+"""
+Tenant database provisioning off the request path.
+
+tenants.replenish_spares keeps TENANT_SPARE_POOL_SIZE pre-created,
+schema-initialized databases in main.tenant_spares. Registration claims one
+with SELECT ... FOR UPDATE SKIP LOCKED in the same transaction that inserts
+the user, so two signups can never get the same database. When no spare is
+left, tenants.provision_registration creates the database and the user in
+the background; its state is served by GET /api/auth/register/<job_id>.
+
+Every registration first inserts its registration_jobs row with the
+username in the unique pending_username column, so two signups for one name
+cannot both proceed, whether they claim a spare or wait for provisioning.
+"""
+import json
+import logging
+import secrets
+import uuid
+
+import mysql.connector
+
+from celery_app import celery_app
+from config import config
+from db import get_main_connection
+from utils.helpers import create_tenant_database, random_password
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REPLENISH_LOCK_KEY = "tenants:replenish_lock"
+DUPLICATE_KEY = 1062
+
+
+class UsernameTaken(Exception):
+    """The username belongs to an existing user or to a registration in progress."""
+
+_INSERT_USER_SQL = """
+    INSERT INTO users (
+        username, password_hash, email,
+        db_name, db_user, db_password, db_host,
+        sms_api_url, sms_api_token, sms_sender_id,
+        sms_quota, sms_used, company_type
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, %s)
+"""
+
+
+def _insert_user(cur, account, tenant_db):
+    cur.execute(_INSERT_USER_SQL, (
+        account["username"], account["password_hash"], account.get("email"),
+        tenant_db["db_name"], tenant_db["db_user"], tenant_db["db_password"], tenant_db["db_host"],
+        account.get("sms_api_url"), account.get("sms_api_token"), account.get("sms_sender_id"),
+        account.get("sms_quota", 0), account.get("company_type"),
+    ))
+    return cur.lastrowid
+
+
+def claim_spare(account):
+    """
+    Create the user on a spare database. Returns (user_id, db_name), or None
+    when no spare is available.
+    """
+    conn = get_main_connection()
+    cur = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cur.execute("""
+            SELECT id, db_name, db_user, db_password, db_host
+            FROM tenant_spares
+            WHERE claimed_by IS NULL
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """)
+        spare = cur.fetchone()
+        if not spare:
+            conn.rollback()
+            return None
+        user_id = _insert_user(cur, account, spare)
+        cur.execute("UPDATE tenant_spares SET claimed_by = %s, claimed_at = NOW() WHERE id = %s",
+                    (user_id, spare["id"]))
+        conn.commit()
+        return user_id, spare["db_name"]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+        kick_replenish()
+
+
+def _new_tenant_db():
+    token = secrets.token_hex(6)
+    tenant_db = {
+        "db_name": f"sya_t_{token}",
+        "db_user": f"user_t_{token}",
+        "db_password": random_password(),
+        "db_host": config.MAIN_DB_HOST,
+    }
+    create_tenant_database(tenant_db["db_name"], tenant_db["db_user"], tenant_db["db_password"])
+    return tenant_db
+
+
+def _add_spare(tenant_db):
+    conn = get_main_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO tenant_spares (db_name, db_user, db_password, db_host)
+        VALUES (%s, %s, %s, %s)
+    """, (tenant_db["db_name"], tenant_db["db_user"], tenant_db["db_password"], tenant_db["db_host"]))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def kick_replenish():
+    try:
+        if get_redis().set(REPLENISH_LOCK_KEY + ":kick", 1, nx=True, ex=30):
+            replenish_spares.delay()
+    except Exception as exc:
+        logger.warning("Could not schedule spare replenishment: %s", exc)
+
+
+@celery_app.task(name="tenants.replenish_spares")
+def replenish_spares():
+    """Create spare tenant databases until TENANT_SPARE_POOL_SIZE are unclaimed."""
+    client = get_redis()
+    client.delete(REPLENISH_LOCK_KEY + ":kick")
+    if not client.set(REPLENISH_LOCK_KEY, 1, nx=True, ex=config.TENANT_SPARE_LOCK_SECONDS):
+        return {"status": "busy"}
+    created = 0
+    try:
+        conn = get_main_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM tenant_spares WHERE claimed_by IS NULL")
+        missing = config.TENANT_SPARE_POOL_SIZE - cur.fetchone()[0]
+        cur.close()
+        conn.close()
+
+        for _ in range(max(missing, 0)):
+            _add_spare(_new_tenant_db())
+            created += 1
+            client.expire(REPLENISH_LOCK_KEY, config.TENANT_SPARE_LOCK_SECONDS)
+    finally:
+        client.delete(REPLENISH_LOCK_KEY)
+    logger.info("Created %d spare tenant databases", created)
+    return {"status": "ok", "created": created}
+
+
+def _reserve_username(account):
+    """Insert the registration job that holds the username; raises UsernameTaken."""
+    job_id = str(uuid.uuid4())
+    conn = get_main_connection()
+    cur = conn.cursor()
+    try:
+        try:
+            cur.execute("""
+                INSERT INTO registration_jobs (id, username, pending_username, status, payload)
+                VALUES (%s, %s, %s, 'pending', %s)
+            """, (job_id, account["username"], account["username"], json.dumps(account)))
+            conn.commit()
+        except mysql.connector.IntegrityError as exc:
+            if exc.errno == DUPLICATE_KEY:
+                raise UsernameTaken(account["username"]) from None
+            raise
+        # Only now is the check final: any later signup for this name fails on the reservation
+        cur.execute("SELECT id FROM users WHERE username = %s", (account["username"],))
+        if cur.fetchone():
+            cur.execute("DELETE FROM registration_jobs WHERE id = %s", (job_id,))
+            conn.commit()
+            raise UsernameTaken(account["username"])
+    finally:
+        cur.close()
+        conn.close()
+    return job_id
+
+
+def register_account(account):
+    """
+    Create the user. Returns ("created", user_id, db_name) when a spare was
+    claimed, or ("queued", job_id, None) when the database is provisioned in
+    the background. Raises UsernameTaken.
+    """
+    job_id = _reserve_username(account)
+    try:
+        claimed = claim_spare(account)
+        if not claimed:
+            provision_registration.delay(job_id)
+            return "queued", job_id, None
+    except Exception as exc:
+        duplicate = isinstance(exc, mysql.connector.IntegrityError) and exc.errno == DUPLICATE_KEY
+        _update_job(job_id, "failed", error="Username already exists" if duplicate else str(exc)[:1000])
+        if duplicate:   # a user created outside registration, e.g. by an admin
+            raise UsernameTaken(account["username"]) from None
+        raise
+    user_id, db_name = claimed
+    _update_job(job_id, "completed", user_id=user_id, db_name=db_name)
+    return "created", user_id, db_name
+
+
+def get_registration_job(job_id):
+    conn = get_main_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT id, username, status, user_id, db_name, error, created_at, updated_at
+        FROM registration_jobs WHERE id = %s
+    """, (job_id,))
+    job = cur.fetchone()
+    cur.close()
+    conn.close()
+    return job
+
+
+def _update_job(job_id, status, **fields):
+    columns = ["status = %s"] + [f"{name} = %s" for name in fields]
+    if status in ("completed", "failed"):
+        # Drop the stored password hash and API token; the user row (or nobody) now holds the name
+        columns.extend(["payload = NULL", "pending_username = NULL"])
+    conn = get_main_connection()
+    cur = conn.cursor()
+    cur.execute(f"UPDATE registration_jobs SET {', '.join(columns)} WHERE id = %s",
+                (status, *fields.values(), job_id))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+@celery_app.task(name="tenants.provision_registration")
+def provision_registration(job_id):
+    conn = get_main_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT status, payload FROM registration_jobs WHERE id = %s", (job_id,))
+    job = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not job or job["status"] not in ("pending", "provisioning"):
+        return {"status": "skipped"}
+    account = json.loads(job["payload"])
+
+    _update_job(job_id, "provisioning")
+    try:
+        # A spare may have been added since the request
+        claimed = claim_spare(account)
+        if claimed:
+            user_id, db_name = claimed
+        else:
+            tenant_db = _new_tenant_db()
+            conn = get_main_connection()
+            cur = conn.cursor()
+            try:
+                user_id = _insert_user(cur, account, tenant_db)
+                conn.commit()
+            except Exception:
+                # The fresh database is still good as a spare
+                _add_spare(tenant_db)
+                raise
+            finally:
+                cur.close()
+                conn.close()
+            db_name = tenant_db["db_name"]
+    except Exception as exc:
+        logger.exception("Registration job %s failed: %s", job_id, exc)
+        _update_job(job_id, "failed", error=str(exc)[:1000])
+        return {"status": "failed"}
+
+    _update_job(job_id, "completed", user_id=user_id, db_name=db_name)
+    return {"status": "completed", "user_id": user_id}
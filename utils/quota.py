@@ -0,0 +1,146 @@
+# backend/utils/quota.py
+"""
+SMS quota ledger in Redis.
+
+quota:<user_id> holds the limit (users.sms_quota, 0 = unlimited), the used
+count and the part of it not yet written back to users.sms_used.
+Senders reserve a block before dispatch and commit what they actually sent;
+reservations live in quota:<user_id>:res with an expiry so a crashed worker
+cannot hold quota forever. All checks run inside Lua, so concurrent senders
+can never overrun the limit.
+"""
+import logging
+import uuid
+
+from config import config
+from db import get_main_connection
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: ledger, reservations; ARGV: amount, token, ttl. Returns amount granted, -1 if not loaded.
+_RESERVE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local now = tonumber(redis.call('TIME')[1])
+local reserved = 0
+local res = redis.call('HGETALL', KEYS[2])
+for i = 1, #res, 2 do
+    local amount, expires = string.match(res[i + 1], '(%d+):(%d+)')
+    if tonumber(expires) <= now then
+        redis.call('HDEL', KEYS[2], res[i])
+    else
+        reserved = reserved + tonumber(amount)
+    end
+end
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or 0)
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or 0)
+local grant = tonumber(ARGV[1])
+if limit > 0 then
+    grant = math.max(0, math.min(grant, limit - used - reserved))
+end
+if grant > 0 then
+    redis.call('HSET', KEYS[2], ARGV[2], grant .. ':' .. (now + tonumber(ARGV[3])))
+end
+return grant
+"""
+
+# KEYS: ledger, reservations; ARGV: token, used
+_COMMIT_LUA = """
+redis.call('HDEL', KEYS[2], ARGV[1])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('HINCRBY', KEYS[1], 'used', ARGV[2])
+    redis.call('HINCRBY', KEYS[1], 'unsynced', ARGV[2])
+end
+return 1
+"""
+
+# KEYS: ledger. Takes the unsynced count and zeroes it atomically.
+_DRAIN_LUA = """
+local n = tonumber(redis.call('HGET', KEYS[1], 'unsynced') or 0)
+if n > 0 then
+    redis.call('HINCRBY', KEYS[1], 'unsynced', -n)
+end
+return n
+"""
+
+_scripts = {}
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = get_redis().register_script(source)
+    return _scripts[name]
+
+
+def _keys(user_id):
+    return [f"quota:{user_id}", f"quota:{user_id}:res"]
+
+
+def _load(user_id):
+    """Seed the ledger from users.sms_quota / sms_used (no-op if another worker already did)."""
+    conn = get_main_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT sms_quota, sms_used FROM users WHERE id=%s", (user_id,))
+        row = cur.fetchone() or {}
+        cur.close()
+    finally:
+        conn.close()
+    key = _keys(user_id)[0]
+    pipe = get_redis().pipeline()
+    pipe.hsetnx(key, "limit", int(row.get("sms_quota") or 0))
+    pipe.hsetnx(key, "used", int(row.get("sms_used") or 0))
+    pipe.hsetnx(key, "unsynced", 0)
+    pipe.execute()
+
+
+def reserve(user_id, amount):
+    """Reserve up to `amount` sends. Returns (token, granted); granted may be 0."""
+    token = uuid.uuid4().hex
+    args = [int(amount), token, config.SMS_QUOTA_RESERVATION_SECONDS]
+    granted = _script("reserve", _RESERVE_LUA)(keys=_keys(user_id), args=args)
+    if granted == -1:
+        _load(user_id)
+        granted = _script("reserve", _RESERVE_LUA)(keys=_keys(user_id), args=args)
+    return token, int(granted)
+
+
+def commit(user_id, token, used):
+    """Record `used` sends against a reservation and release the rest of it."""
+    _script("commit", _COMMIT_LUA)(keys=_keys(user_id), args=[token, int(used)])
+
+
+def set_limit(user_id, limit):
+    """Apply a changed users.sms_quota to a loaded ledger."""
+    key = _keys(user_id)[0]
+    client = get_redis()
+    if client.exists(key):
+        client.hset(key, "limit", int(limit or 0))
+
+
+def reconcile(user_id, force=False):
+    """
+    Write sends counted in Redis back to users.sms_used in one UPDATE.
+    Runs at most every SMS_QUOTA_SYNC_SECONDS per tenant unless forced.
+    """
+    client = get_redis()
+    if not force and not client.set(f"quota:{user_id}:sync", 1, nx=True, ex=config.SMS_QUOTA_SYNC_SECONDS):
+        return 0
+    n = int(_script("drain", _DRAIN_LUA)(keys=_keys(user_id)[:1]))
+    if not n:
+        return 0
+    try:
+        conn = get_main_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("UPDATE users SET sms_used = sms_used + %s WHERE id = %s", (n, user_id))
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+    except Exception:
+        client.hincrby(_keys(user_id)[0], "unsynced", n)
+        raise
+    return n
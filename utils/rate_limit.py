@@ -0,0 +1,127 @@
+# backend/utils/rate_limit.py
+import logging
+import time
+from urllib.parse import urlparse
+
+import redis
+
+from config import config
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Token bucket over N keys, evaluated atomically inside Redis so every worker
+# draws from the same buckets. Uses the Redis clock, not the workers' clocks.
+# KEYS: bucket keys; ARGV: rate_1, burst_1, ..., rate_n, burst_n, cost
+# Returns "0" when the tokens were taken, otherwise the seconds to wait.
+# A bucket may go into debt (cost > burst), which keeps the long-run rate exact
+# for bulk requests that cost more than one token.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[#ARGV])
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    level = math.min(burst, level + math.max(0, now - ts) * rate)
+    tokens[i] = level
+    local need = math.min(cost, burst)
+    if level < need then
+        wait = math.max(wait, (need - level) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local level = tokens[i]
+    if wait == 0 then
+        level = level - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(level), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil((burst - math.min(level, 0)) / rate * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+_script = None
+
+
+def provider_host(api_url):
+    return (urlparse(api_url or "").hostname or "").lower()
+
+
+def provider_rate(host):
+    """(rate, burst) for a provider host, from SMS_PROVIDER_RATE_LIMITS or the defaults."""
+    limits = config.SMS_PROVIDER_RATE_LIMITS.get(host) or {}
+    rate = float(limits.get("rate", config.SMS_PROVIDER_DEFAULT_RATE))
+    burst = float(limits.get("burst", config.SMS_PROVIDER_DEFAULT_BURST))
+    return rate, max(burst, 1.0)
+
+
+class TokenBucketLimiter:
+    """
+    Redis-backed token bucket shared by all Celery workers.
+    buckets: list of (key, rate_per_second, burst); a send takes tokens from all of them.
+    """
+
+    def __init__(self, buckets, client=None):
+        self.buckets = [(key, float(rate), float(burst)) for key, rate, burst in buckets if rate and rate > 0]
+        self.client = client
+
+    def _eval(self, cost):
+        global _script
+        client = self.client or get_redis()
+        if _script is None:
+            _script = client.register_script(_TOKEN_BUCKET_LUA)
+        keys = [key for key, _, _ in self.buckets]
+        args = []
+        for _, rate, burst in self.buckets:
+            args.extend([rate, burst])
+        args.append(cost)
+        return float(_script(keys=keys, args=args, client=client))
+
+    def acquire(self, cost=1):
+        """Block until `cost` tokens are available in every bucket."""
+        if not self.buckets:
+            return
+        while True:
+            try:
+                wait = self._eval(cost)
+            except redis.RedisError as exc:
+                logger.warning("Rate limiter unavailable (%s), falling back to fixed delay", exc)
+                time.sleep(config.SEND_DELAY_SECONDS)
+                return
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+def sms_limiter(user_id, api_url, user_rate=None, user_burst=None, lane="bulk"):
+    """
+    Limiter for one tenant sending through one provider: provider bucket + tenant bucket.
+
+    SMS_PRIORITY_RESERVED_SHARE of every rate is kept for the "priority" lane
+    in separate buckets, so transactional sends never queue behind campaign
+    debt; "bulk" gets the rest. A share of 0 puts both lanes on the same buckets.
+    """
+    share = min(max(config.SMS_PRIORITY_RESERVED_SHARE, 0.0), 1.0)
+    if share <= 0:
+        scale, suffix = 1.0, ""
+    elif lane == "priority":
+        scale, suffix = share, ":priority"
+    else:
+        scale, suffix = 1.0 - share, ""
+
+    host = provider_host(api_url)
+    rate, burst = provider_rate(host)
+    buckets = [(f"ratelimit:provider:{host}{suffix}", rate * scale, max(burst * scale, 1.0))]
+    if user_rate:
+        user_rate = float(user_rate)
+        user_burst = float(user_burst or user_rate)
+        buckets.append((f"ratelimit:user:{user_id}{suffix}", user_rate * scale, max(user_burst * scale, 1.0)))
+    return TokenBucketLimiter(buckets)
@@ -0,0 +1,13 @@
+# backend/utils/redis_client.py
+import redis
+from config import config
+
+_client = None
+
+
+def get_redis():
+    """Shared Redis client (lazy, thread-safe connection pool) on config.REDIS_URL."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(config.REDIS_URL, decode_responses=True)
+    return _client
@@ -0,0 +1,117 @@
+# backend/utils/replicas.py
+"""
+Replica selection for db.get_main_read_connection / get_user_read_connection.
+
+A replica is used only while its replication lag is at most
+REPLICA_MAX_LAG_SECONDS (checked at most every REPLICA_LAG_CHECK_SECONDS per
+host and process) and only for users that have not written anything in the
+last READ_YOUR_WRITES_SECONDS, so a user always reads their own changes.
+Everything else falls back to the primary.
+
+The lag is read with the REPLICA_MONITOR_USER account, which needs the
+REPLICATION CLIENT privilege on every replica host (tenant accounts only have
+rights on their own database); a replica whose status cannot be read is not
+used. Health is a property of the host, so it is cached per host. One probe
+per host runs at a time in a process:
+concurrent callers get the last known state meanwhile (unhealthy if none).
+"""
+import logging
+import random
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+from redis.exceptions import RedisError
+
+from config import config
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_health = {}   # host -> (checked_at, healthy)
+_probing = set()   # hosts with a lag probe in flight
+_health_lock = threading.Lock()
+
+
+def _ryw_key(user_id):
+    return f"ryw:{user_id}"
+
+
+def mark_write(user_id):
+    """Route the user's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    if not config.MAIN_DB_REPLICA_HOSTS and not config.TENANT_DB_REPLICA_HOSTS:
+        return
+    try:
+        get_redis().set(_ryw_key(user_id), 1, ex=config.READ_YOUR_WRITES_SECONDS)
+    except RedisError as exc:
+        logger.warning("Could not record write for user %s: %s", user_id, exc)
+
+
+def recently_wrote(user_id):
+    try:
+        return bool(get_redis().exists(_ryw_key(user_id)))
+    except RedisError:
+        return True   # unknown: the primary is always safe
+
+
+def _replica_lag(host):
+    """Seconds behind the source, or None if replication is not running."""
+    conn = mysql.connector.connect(host=host, user=config.REPLICA_MONITOR_USER,
+                                   password=config.REPLICA_MONITOR_PASSWORD, connection_timeout=2)
+    try:
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            cur.execute("SHOW SLAVE STATUS")   # MySQL < 8.0.22 / MariaDB
+        status = cur.fetchone() or {}
+        cur.close()
+    finally:
+        conn.close()
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+def is_healthy(host):
+    """Whether `host` is replicating within REPLICA_MAX_LAG_SECONDS."""
+    now = time.monotonic()
+    with _health_lock:
+        cached = _health.get(host)
+        if cached and now - cached[0] < config.REPLICA_LAG_CHECK_SECONDS:
+            return cached[1]
+        if host in _probing:
+            # Someone is already checking: don't pile up connections to a slow replica
+            return cached[1] if cached else False
+        _probing.add(host)
+    healthy = False
+    try:
+        lag = _replica_lag(host)
+        healthy = lag is not None and lag <= config.REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            logger.warning("Replica %s not used: lag=%s", host, lag)
+    except mysql.connector.Error as exc:
+        if exc.errno == errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR:
+            logger.error("Replica %s not used: REPLICA_MONITOR_USER lacks REPLICATION CLIENT (%s)", host, exc.msg)
+        else:
+            logger.warning("Replica %s lag check failed: %s", host, exc)
+    except Exception as exc:
+        logger.warning("Replica %s lag check failed: %s", host, exc)
+    finally:
+        with _health_lock:
+            _health[host] = (time.monotonic(), healthy)
+            _probing.discard(host)
+    return healthy
+
+
+def mark_unhealthy(host):
+    with _health_lock:
+        _health[host] = (time.monotonic(), False)
+
+
+def pick_replica(hosts, user_id=None):
+    """A healthy replica host to read from, or None for the primary."""
+    if not hosts or (user_id is not None and recently_wrote(user_id)):
+        return None
+    healthy = [host for host in hosts if is_healthy(host)]
+    return random.choice(healthy) if healthy else None
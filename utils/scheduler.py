@@ -0,0 +1,209 @@
+# backend/utils/scheduler.py
+"""
+Fair-share dispatch of per-tenant Celery work.
+
+Jobs are not sent to Celery directly: submit() appends them to a per-tenant
+Redis list and puts the tenant on a ring. dispatch() walks the ring
+round-robin and hands out leases (dispatch slots), one job per tenant per
+turn, up to a per-tenant cap and a global cap. Only leased jobs are sent to
+the broker, so a big tenant cannot fill the workers while others wait.
+Leases expire on their own, so a crashed worker gives its slot back. Jobs
+submitted with a countdown wait in a due-time sorted set and join their
+tenant's queue only once due, so a delayed job never holds a slot while idle.
+
+All keys share the {sched} hash tag and every key a script touches is passed
+in KEYS, so the scripts also run on Redis Cluster.
+"""
+import json
+import logging
+import uuid
+from collections import Counter
+
+from celery_app import celery_app
+from config import config
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RING_KEY = "{sched}:ring"
+ACTIVE_KEY = "{sched}:active"
+RUNNING_KEY = "{sched}:running"
+CAPS_KEY = "{sched}:caps"
+LEASE_SEQ_KEY = "{sched}:lease_seq"
+DELAYED_KEY = "{sched}:delayed"   # zset of delayed jobs (JSON with user_id and job), scored by due time
+TICK_KEY = "{sched}:tick"
+
+
+def _queue_key(user_id):
+    return f"{{sched}}:queue:{user_id}"
+
+
+def _running_key(user_id):
+    return f"{{sched}}:running:{user_id}"
+
+
+# KEYS: ring, active set, running zset, caps hash, lease sequence, then the queue
+#       and running keys of each tenant listed in ARGV
+# ARGV: lease_seconds, global_cap, default_tenant_cap, tenant ids (in KEYS order)
+# Tenants that joined the ring after the caller read it are not passed; they are
+# skipped until the next dispatch.
+# Returns a flat list [token_1, job_1, token_2, job_2, ...] of leased jobs.
+_DISPATCH_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local lease = tonumber(ARGV[1])
+local global_cap = tonumber(ARGV[2])
+local default_cap = tonumber(ARGV[3])
+local ring, active, running, caps, seq = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local tenant_keys = {}
+for i = 4, #ARGV do
+    tenant_keys[ARGV[i]] = 6 + (i - 4) * 2
+end
+redis.call('ZREMRANGEBYSCORE', running, '-inf', now)
+local out = {}
+local idle = 0
+local n = redis.call('LLEN', ring)
+while n > 0 and idle < n do
+    if redis.call('ZCARD', running) >= global_cap then
+        break
+    end
+    local uid = redis.call('RPOPLPUSH', ring, ring)
+    local k = tenant_keys[uid]
+    if not k then
+        idle = idle + 1
+    elseif redis.call('LLEN', KEYS[k]) == 0 then
+        redis.call('LREM', ring, 0, uid)
+        redis.call('SREM', active, uid)
+        n = n - 1
+    else
+        local qkey, rkey = KEYS[k], KEYS[k + 1]
+        redis.call('ZREMRANGEBYSCORE', rkey, '-inf', now)
+        local cap = tonumber(redis.call('HGET', caps, uid) or default_cap)
+        if redis.call('ZCARD', rkey) < cap then
+            local job = redis.call('LPOP', qkey)
+            local token = uid .. ':' .. redis.call('INCR', seq)
+            redis.call('ZADD', rkey, now + lease, token)
+            redis.call('ZADD', running, now + lease, token)
+            table.insert(out, token)
+            table.insert(out, job)
+            idle = 0
+        else
+            idle = idle + 1
+        end
+    end
+end
+return out
+"""
+
+# KEYS: delayed zset, tenant queue, active set, ring
+# ARGV: delayed member, tenant id, job
+# Moves one due job to its tenant's queue; a no-op if another dispatcher already did.
+_PROMOTE_LUA = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[3])
+if redis.call('SADD', KEYS[3], ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[4], ARGV[2])
+end
+return 1
+"""
+
+_dispatch_script = None
+_promote_script = None
+
+
+def tenant_cap(user_id):
+    return int(config.SMS_TENANT_SLOTS.get(str(user_id), config.SMS_TENANT_MAX_SLOTS))
+
+
+def _redis_now(client):
+    seconds, micros = client.time()
+    return seconds + micros / 1_000_000
+
+
+def submit(user_id, task_name, args, countdown=0):
+    """Queue a job for a tenant (after `countdown` seconds) and dispatch whatever fits in the free slots."""
+    client = get_redis()
+    job = json.dumps({"task": task_name, "args": list(args)})
+    pipe = client.pipeline()
+    pipe.hset(CAPS_KEY, user_id, tenant_cap(user_id))
+    if countdown and countdown > 0:
+        member = json.dumps({"id": uuid.uuid4().hex, "user_id": str(user_id), "job": job})
+        pipe.zadd(DELAYED_KEY, {member: _redis_now(client) + countdown})
+        pipe.execute()
+        dispatch()
+        return
+    pipe.rpush(_queue_key(user_id), job)
+    pipe.sadd(ACTIVE_KEY, user_id)
+    added = pipe.execute()[-1]
+    if added:
+        client.rpush(RING_KEY, user_id)
+    dispatch()
+
+
+def _promote_due(client):
+    """Move delayed jobs that are due into their tenants' queues."""
+    global _promote_script
+    if _promote_script is None:
+        _promote_script = client.register_script(_PROMOTE_LUA)
+    for member in client.zrangebyscore(DELAYED_KEY, "-inf", _redis_now(client), start=0, num=1000):
+        entry = json.loads(member)
+        uid = entry["user_id"]
+        _promote_script(keys=[DELAYED_KEY, _queue_key(uid), ACTIVE_KEY, RING_KEY],
+                        args=[member, uid, entry["job"]], client=client)
+
+
+def dispatch():
+    """Lease free slots round-robin across tenants and send the leased jobs to Celery."""
+    global _dispatch_script
+    client = get_redis()
+    if _dispatch_script is None:
+        _dispatch_script = client.register_script(_DISPATCH_LUA)
+    _promote_due(client)
+    tenants = list(dict.fromkeys(client.lrange(RING_KEY, 0, -1)))
+    keys = [RING_KEY, ACTIVE_KEY, RUNNING_KEY, CAPS_KEY, LEASE_SEQ_KEY]
+    for uid in tenants:
+        keys += [_queue_key(uid), _running_key(uid)]
+    leased = _dispatch_script(keys=keys, args=[config.SMS_SCHEDULER_LEASE_SECONDS,
+                                               config.SMS_SCHEDULER_MAX_SLOTS,
+                                               config.SMS_TENANT_MAX_SLOTS, *tenants])
+    for token, raw in zip(leased[0::2], leased[1::2]):
+        job = json.loads(raw)
+        celery_app.send_task(job["task"], args=job["args"], kwargs={"lease": token})
+
+    # Jobs left waiting on a full slot table or not due yet: make sure someone looks
+    # again even if the lease holders die without releasing
+    if (client.scard(ACTIVE_KEY) or client.zcard(DELAYED_KEY)) and client.set(TICK_KEY, 1, nx=True,
+                                                 ex=max(1, config.SMS_SCHEDULER_TICK_SECONDS - 1)):
+        celery_app.send_task("sms.scheduler_tick", countdown=config.SMS_SCHEDULER_TICK_SECONDS)
+    return len(leased) // 2
+
+
+def release(lease):
+    """Give a dispatch slot back and let the next tenant in line have it."""
+    if not lease:
+        return
+    user_id = lease.split(":", 1)[0]
+    pipe = get_redis().pipeline()
+    pipe.zrem(_running_key(user_id), lease)
+    pipe.zrem(RUNNING_KEY, lease)
+    pipe.execute()
+    dispatch()
+
+
+def queue_stats():
+    """{user_id: {"queued": n, "delayed": n, "running": n}} for every tenant with queued, delayed or running work."""
+    client = get_redis()
+    delayed = Counter(json.loads(member)["user_id"] for member in client.zrange(DELAYED_KEY, 0, -1))
+    tenants = set(client.smembers(ACTIVE_KEY)) | set(delayed)
+    tenants.update(token.split(":", 1)[0] for token in client.zrange(RUNNING_KEY, 0, -1))
+    pipe = client.pipeline()
+    for uid in sorted(tenants):
+        pipe.llen(_queue_key(uid))
+        pipe.zcard(_running_key(uid))
+    counts = pipe.execute()
+    return {
+        uid: {"queued": counts[2 * i], "delayed": delayed[uid], "running": counts[2 * i + 1], "cap": tenant_cap(uid)}
+        for i, uid in enumerate(sorted(tenants))
+    }
@@ -0,0 +1,116 @@
+# backend/utils/sent_messages.py
+import logging
+import time
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# One multi-row upsert with the same semantics as the old per-message statements:
+# 'sent' resets retries to 0, 'failed' inserts with retries+1 or bumps the stored count.
+_UPSERT_SQL = """
+    INSERT INTO sent_messages (phone, message, status, retries)
+    VALUES {placeholders}
+    ON DUPLICATE KEY UPDATE
+        status = VALUES(status),
+        retries = IF(VALUES(status) = 'sent', 0, sent_messages.retries + 1)
+"""
+# The same for rows replayed from the outbox, each tagged with its entry key (utils/outbox.py):
+# a row whose stored key is not older was applied already and is left as is. The key is assigned
+# last because MySQL evaluates the assignments in order.
+_REPLAY_UPSERT_SQL = """
+    INSERT INTO sent_messages (phone, message, status, retries, outbox_entry)
+    VALUES {placeholders}
+    ON DUPLICATE KEY UPDATE
+        retries = IF(sent_messages.outbox_entry >= VALUES(outbox_entry), sent_messages.retries,
+                     IF(VALUES(status) = 'sent', 0, sent_messages.retries + 1)),
+        status = IF(sent_messages.outbox_entry >= VALUES(outbox_entry), sent_messages.status, VALUES(status)),
+        outbox_entry = GREATEST(COALESCE(sent_messages.outbox_entry, ''), VALUES(outbox_entry))
+"""
+_MAX_ROWS_PER_STATEMENT = 1000
+
+
+def send_result_row(phone, message, sent, retries):
+    """(phone, message, status, retries) row for a send outcome; `retries` is the count before this send."""
+    if sent:
+        return (phone, message, "sent", 0)
+    return (phone, message, "failed", int(retries or 0) + 1)
+
+
+def upsert_send_results(conn, rows, entry_keys=None):
+    """
+    Write result rows as multi-row upserts in a single transaction. Returns
+    rows written. With `entry_keys` (one increasing key per row) writing the
+    same rows again changes nothing.
+    """
+    if not rows:
+        return 0
+    sql, width = _UPSERT_SQL, 4
+    if entry_keys is not None:
+        rows = [(*row, key) for row, key in zip(rows, entry_keys)]
+        sql, width = _REPLAY_UPSERT_SQL, 5
+    placeholder = "(" + ",".join(["%s"] * width) + ")"
+    cur = conn.cursor()
+    try:
+        conn.start_transaction()
+        for i in range(0, len(rows), _MAX_ROWS_PER_STATEMENT):
+            chunk = rows[i:i + _MAX_ROWS_PER_STATEMENT]
+            flat_values = []
+            for r in chunk:
+                flat_values.extend(r)
+            cur.execute(sql.format(placeholders=",".join([placeholder] * len(chunk))), flat_values)
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+class SentMessageBuffer:
+    """
+    Buffers send outcomes and writes them with upsert_send_results once
+    `max_rows` are pending or the oldest pending row is `max_age` seconds old.
+    Callers must flush() in a finally block; rows stay buffered if a flush fails
+    so the next flush retries them.
+    """
+
+    def __init__(self, conn, max_rows=None, max_age=None):
+        self.conn = conn
+        self.max_rows = max_rows or config.SMS_RESULT_FLUSH_ROWS
+        self.max_age = max_age if max_age is not None else config.SMS_RESULT_FLUSH_SECONDS
+        self.rows = []
+        self.units = []    # quota units (messages or segments) per buffered row
+        self.first_added = None
+        self.sent = 0      # flushed 'sent' rows
+        self.sent_units = 0
+        self.failed = 0    # flushed 'failed' rows
+        self.writes = 0    # transactions committed
+
+    def add(self, phone, message, sent, retries=0, units=1):
+        if not self.rows:
+            self.first_added = time.monotonic()
+        self.rows.append(send_result_row(phone, message, sent, retries))
+        self.units.append(units)
+        if len(self.rows) >= self.max_rows or time.monotonic() - self.first_added >= self.max_age:
+            self.flush()
+
+    def _write(self, rows):
+        upsert_send_results(self.conn, rows)
+
+    def flush(self):
+        if not self.rows:
+            return 0
+        rows, units = self.rows, self.units
+        self._write(rows)
+        self.rows, self.units = [], []
+        self.writes += 1
+        sent = 0
+        for row, n in zip(rows, units):
+            if row[2] == "sent":
+                sent += 1
+                self.sent_units += n
+        self.sent += sent
+        self.failed += len(rows) - sent
+        return len(rows)
@@ -1,8 +1,13 @@
 # backend/utils/sms_utils.py
 import logging
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlparse
 
+from config import config
+from utils.circuit_breaker import CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
 # Replace with the exact domains of SMS providers you trust
@@ -20,6 +25,8 @@ def is_allowed_api_url(url: str) -> bool:
     try:
         parsed = urlparse(url)
         hostname = (parsed.hostname or "").lower()
+        if config.SMS_TEST_MODE and hostname in config.SMS_TEST_PROVIDER_HOSTS:
+            return True
         return hostname in ALLOWED_DOMAINS
     except Exception:
         return False
@@ -31,20 +38,66 @@ def mask_token(token: str) -> str:
         return "****"
     return token[:4] + "…" + token[-4:]
 
-def retry_post(session_post, url, json_payload, headers, timeout=10, retries=3):
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_post(session_post, url, json_payload, headers, timeout=10, retries=3, breaker=None):
     """
-    Simple exponential backoff retry wrapper around requests.Session.post.
+    Exponential backoff retry wrapper around requests.Session.post.
     session_post: e.g., session.post
+
+    Retries on exceptions, HTTP 429 and 5xx, waiting for Retry-After when the
+    provider sends one. With a CircuitBreaker, every attempt is gated by it and
+    reports its outcome to it. CircuitOpenError is raised (nothing was accepted)
+    while the circuit is open, when the provider asks for a longer pause than
+    SMS_RETRY_MAX_WAIT_SECONDS, and when the last attempt is still throttled
+    (429 or Retry-After), so the caller defers the recipients instead of
+    blocking or recording them as failed.
     """
     backoff = 1.0
     last_exc = None
     for attempt in range(1, retries + 1):
+        if breaker:
+            breaker.check()
         try:
             resp = session_post(url, json=json_payload, headers=headers, timeout=timeout)
-            return resp
         except Exception as ex:
             last_exc = ex
-            logger.warning("POST attempt %d failed for %s: %s (waiting %.1fs)", attempt, url, ex, backoff)
-            time.sleep(backoff)
+            if breaker:
+                breaker.failure()
+            delay = backoff
+            logger.warning("POST attempt %d failed for %s: %s", attempt, url, ex)
+        else:
+            if resp.status_code != 429 and resp.status_code < 500:
+                if breaker:
+                    breaker.success()
+                return resp
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            if breaker:
+                breaker.failure(retry_after)
+            delay = retry_after if retry_after is not None else backoff
+            logger.warning("POST attempt %d to %s returned %s", attempt, url, resp.status_code)
+            if delay > config.SMS_RETRY_MAX_WAIT_SECONDS or (
+                    attempt == retries and (resp.status_code == 429 or retry_after is not None)):
+                # Throttled, not rejected: the caller defers these recipients instead of failing them
+                raise CircuitOpenError(urlparse(url).hostname, delay)
+            if attempt == retries:
+                return resp
+
+        if attempt < retries:
+            logger.warning("Retrying POST to %s in %.1fs", url, delay)
+            time.sleep(delay)
             backoff *= 2
     raise last_exc
@@ -0,0 +1,137 @@
+# backend/utils/templating.py
+"""
+Per-recipient SMS templates, e.g. "Hi {name}, your order is ready".
+
+A template is parsed once per campaign into literal parts and placeholders.
+The GSM-7 / UCS-2 profile of the literal parts is also computed once, so
+rendering a batch only joins strings and profiles the substituted values.
+
+Only the known placeholders are special. Any other brace ("Code {1234}", a
+lone "}") is sent as written, and a message without a known placeholder is
+sent exactly as typed. In a template, {{ and }} stand for literal braces.
+"""
+import math
+import re
+
+# GSM 03.38 default alphabet and the extension table (extension chars take two septets)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Recipient fields a template may use
+PLACEHOLDERS = ("name", "phone")
+
+_PLACEHOLDER_RE = re.compile(r"\{(%s)([!:][^{}]*)?\}" % "|".join(PLACEHOLDERS))
+_TOKEN_RE = re.compile(r"\{\{|\}\}|\{(\w+)([!:][^{}]*)?\}")
+
+
+def text_profile(text):
+    """(is_gsm7, gsm7_septets, ucs2_code_units) for a piece of text."""
+    septets = 0
+    gsm = True
+    for ch in text:
+        if ch in GSM7_BASIC:
+            septets += 1
+        elif ch in GSM7_EXTENDED:
+            septets += 2
+        else:
+            gsm = False
+            break
+    return gsm, septets, len(text.encode("utf-16-le")) // 2
+
+
+def segment_count(encoding, units):
+    """SMS parts needed: GSM-7 160/153 septets, UCS-2 70/67 code units per part."""
+    single, multi = (160, 153) if encoding == "GSM-7" else (70, 67)
+    if units <= single:
+        return 1
+    return math.ceil(units / multi)
+
+
+def text_segments(text):
+    """SMS parts needed for a plain (non-template) text."""
+    gsm, septets, units = text_profile(text)
+    return segment_count("GSM-7", septets) if gsm else segment_count("UCS-2", units)
+
+
+class RenderedMessage:
+    __slots__ = ("text", "encoding", "segments")
+
+    def __init__(self, text, encoding, segments):
+        self.text = text
+        self.encoding = encoding
+        self.segments = segments
+
+
+def _parse(source):
+    """[(literal, field or None)] for a source that uses at least one placeholder."""
+    parts = []
+    literal = []
+    pos = 0
+    for match in _TOKEN_RE.finditer(source):
+        literal.append(source[pos:match.start()])
+        pos = match.end()
+        token, field, spec = match.group(0), match.group(1), match.group(2)
+        if token in ("{{", "}}"):
+            literal.append(token[0])
+        elif field in PLACEHOLDERS:
+            if spec:
+                raise ValueError(f"Invalid message template: formatting is not supported in {token}; "
+                                 "use " + ", ".join(f"{{{p}}}" for p in PLACEHOLDERS)
+                                 + " as is, and {{ / }} for literal braces")
+            parts.append(("".join(literal), field))
+            literal = []
+        else:
+            literal.append(token)   # not a placeholder: plain text
+    literal.append(source[pos:])
+    parts.append(("".join(literal), None))
+    return parts
+
+
+class MessageTemplate:
+    """Compiled template. Raises ValueError for a placeholder with a format spec, e.g. {name:>10}."""
+
+    def __init__(self, source):
+        self.source = source
+        # [(literal, field or None)]; text without a placeholder is never reinterpreted
+        self.parts = _parse(source) if _PLACEHOLDER_RE.search(source) else [(source, None)]
+
+        literal = "".join(lit for lit, _ in self.parts)
+        self.literal_gsm, self.literal_septets, self.literal_units = text_profile(literal)
+        self.fields = [field for _, field in self.parts if field is not None]
+        self.static = None
+        if not self.fields:
+            self.static = self._finish(literal, self.literal_gsm, self.literal_septets, self.literal_units)
+
+    def _finish(self, text, gsm, septets, units):
+        if gsm:
+            return RenderedMessage(text, "GSM-7", segment_count("GSM-7", septets))
+        return RenderedMessage(text, "UCS-2", segment_count("UCS-2", units))
+
+    def render_batch(self, rows):
+        """RenderedMessage for each recipient row (dicts with the placeholder fields)."""
+        if self.static is not None:
+            return [self.static] * len(rows)
+
+        profiles = {}
+        rendered = []
+        for row in rows:
+            gsm, septets, units = self.literal_gsm, self.literal_septets, self.literal_units
+            pieces = []
+            for literal, field in self.parts:
+                pieces.append(literal)
+                if field is None:
+                    continue
+                value = row.get(field)
+                value = "" if value is None else str(value)
+                profile = profiles.get(value)
+                if profile is None:
+                    profile = profiles[value] = text_profile(value)
+                gsm = gsm and profile[0]
+                septets += profile[1]
+                units += profile[2]
+                pieces.append(value)
+            rendered.append(self._finish("".join(pieces), gsm, septets, units))
+        return rendered